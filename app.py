@@ -4,9 +4,13 @@ from dotenv import load_dotenv
 load_dotenv()
 from router import router_bp
 import src.utils as utils
+import src.email
+import src.digest
+import src.status
 
 app = Flask(__name__)
 app.register_blueprint(router_bp)
+src.email.service.init_app(app)
 
 app.config['SECRET_KEY'] = os.environ['SECRET_KEY']
 
@@ -1,112 +1,99 @@
+import queue
 import sqlite3
+import weakref
+import threading
+from contextlib import contextmanager
 
-def get_db_connection():
-    conn = sqlite3.connect('db/main.db')
+DB_PATH = 'db/main.db'
+
+# 커넥션 튜닝 값
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 64 * 1024       # page cache 64MB
+MMAP_SIZE = 256 * 1024 * 1024   # mmap 256MB
+POOL_SIZE = 16                  # 재사용을 위해 보관하는 유휴 커넥션 최대 수
+
+# 프로세스 전체가 함께 쓰는 커넥션 풀. 스레드는 필요할 때 하나를 빌려 쓰고, 다 쓰면 풀에 돌려줌
+# 같은 스레드 안에서 중첩 호출되면 같은 커넥션을 사용하고, 가장 바깥 호출이 끝날 때 반환
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_local = threading.local()
+
+class _Checkout:
+    # 스레드가 빌린 커넥션. 반환하지 않고 스레드가 끝나도 finalize가 풀에 돌려줌
+    def __init__(self, conn):
+        self.conn = conn
+        self.depth = 0
+        self.finalizer = weakref.finalize(self, _release_connection, conn)
+
+def _open_connection():
+    # 풀의 커넥션은 여러 스레드가 번갈아 사용하므로 check_same_thread 해제(동시에 한 스레드만 사용)
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    cursor.close()
     return conn
 
-def close_db_connection(conn):
-    if conn:
+def _close_connection(conn):
+    try:
         conn.close()
-        
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.executescript('''
-        CREATE TABLE IF NOT EXISTS email_verification (
-            email TEXT PRIMARY KEY,
-            verification_code TEXT NOT NULL,
-            is_verified BOOLEAN NOT NULL DEFAULT 0,
-            try_count INTEGER NOT NULL DEFAULT 0,
-            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours'))
-        );
-        
-        CREATE TABLE IF NOT EXISTS users (
-            uid TEXT PRIMARY KEY,
-            email TEXT NOT NULL UNIQUE,
-            password TEXT NOT NULL,
-            salt TEXT NOT NULL,
-            name TEXT NOT NULL,
-            profile_url TEXT DEFAULT NULL,
-            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            FOREIGN KEY (email) REFERENCES email_verification(email)
-        );
-        
-        CREATE TABLE IF NOT EXISTS user_password_find_link (
-            email TEXT NOT NULL,
-            link_hash TEXT NOT NULL,
-            is_used BOOLEAN NOT NULL DEFAULT FALSE,
-            is_active BOOLEAN NOT NULL DEFAULT TRUE,
-            update_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            
-            FOREIGN KEY (email) REFERENCES email_verification(email)
-        );
+    except sqlite3.Error:
+        pass
+
+def _release_connection(conn):
+    # 풀이 가득 찼거나 상태가 잘못된 커넥션은 닫음
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        _pool.put_nowait(conn)
+    except (queue.Full, sqlite3.Error):
+        _close_connection(conn)
+
+def get_db_connection():
+    checkout = getattr(_local, 'checkout', None)
+    if checkout is None:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            conn = _open_connection()
+        checkout = _Checkout(conn)
+        _local.checkout = checkout
+    checkout.depth += 1
+    return checkout.conn
 
-        CREATE TABLE IF NOT EXISTS user_sessions (
-            sid TEXT PRIMARY KEY,
-            uid TEXT NOT NULL,
-            user_agent TEXT NOT NULL,
-            ip_address TEXT NOT NULL,
-            is_active BOOLEAN NOT NULL DEFAULT 1,
-            last_accessed TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            update_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            expires_at TIMESTAMP NOT NULL,
-            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            FOREIGN KEY (uid) REFERENCES users(uid)
-        );
-        
-        CREATE TABLE IF NOT EXISTS user_session_deactive_link (
-            sid TEXT PRIMARY KEY,
-            link_hash TEXT NOT NULL,
-            is_used BOOLEAN NOT NULL DEFAULT FALSE,
-            update_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+def close_db_connection(conn):
+    # 커밋되지 않은 작업은 정리하고, 가장 바깥 호출이면 커넥션을 풀에 반환
+    if conn and conn.in_transaction:
+        conn.rollback()
+    checkout = getattr(_local, 'checkout', None)
+    if checkout is None or checkout.conn is not conn:
+        return
+    checkout.depth -= 1
+    if checkout.depth <= 0:
+        _local.checkout = None
+        checkout.finalizer()
 
-            FOREIGN KEY (sid) REFERENCES user_sessions(sid)
-        );
+@contextmanager
+def connection():
+    # 정상 종료 시 커밋, 예외 발생 시 롤백
+    conn = get_db_connection()
+    try:
+        yield conn
+        if conn.in_transaction:
+            conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        close_db_connection(conn)
 
-        CREATE TABLE IF NOT EXISTS foods (
-            fid TEXT PRIMARY KEY,
-            uid TEXT NOT NULL,
-            is_active BOOLEAN NOT NULL DEFAULT 1,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL,
-            ingredients TEXT DEFAULT '정보없음',
-            description TEXT NOT NULL,
-            count INTEGER NOT NULL DEFAULT 0,
-            volume TEXT DEFAULT NULL,
-            image_url TEXT DEFAULT NULL,
-            barcode TEXT NOT NULL,
-            expiration_date_desc TEXT,
-            expiration_date DATE NOT NULL,
-            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            FOREIGN KEY (uid) REFERENCES users(uid)
-        );
+def init_db():
+    db.migration.migrate()
 
-        CREATE TABLE IF NOT EXISTS food_chat (
-            fcid TEXT PRIMARY KEY,
-            uid TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'created',
-            response TEXT DEFAULT NULL,
-            usage_input_token INTEGER NOT NULL DEFAULT 0,
-            usage_output_token INTEGER NOT NULL DEFAULT 0,
-            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
-            FOREIGN KEY (uid) REFERENCES users(uid)
-        );
-        CREATE TABLE IF NOT EXISTS food_chat_items (
-            fcid TEXT NOT NULL,
-            fid TEXT NOT NULL,
-            FOREIGN KEY (fcid) REFERENCES food_chat(fcid),
-            FOREIGN KEY (fid) REFERENCES foods(fid),
-            PRIMARY KEY (fcid, fid)
-        )
-    ''')
-    
-    conn.commit()
-    close_db_connection(conn)
-    
-init_db()
\ No newline at end of file
+import db.migration
+init_db()
@@ -0,0 +1,144 @@
+import os
+import csv
+import json
+import argparse
+import db
+
+# 오프라인 상품 카탈로그(product_catalog). 등록 시 외부 API보다 먼저 조회
+CATALOG_FIELDS = ('name', 'type', 'ingredients', 'pog_daycnt', 'volume', 'image_url')
+LOAD_CHUNK_SIZE = 5000
+JSON_READ_SIZE = 1024 * 1024
+
+# 덤프 파일의 컬럼명 -> product_catalog 컬럼 (C005, retaildb 형식 모두 지원)
+# 튜플은 중첩된 값의 경로. retaildb 레코드는 product_lookup._fetch_retaildb와 같은 응답 형식에 barcode 필드가 추가된 것으로 가정
+FIELD_ALIASES = {
+    'barcode': ('barcode', 'BAR_CD', 'bar_cd'),
+    'name': ('name', 'PRDLST_NM', 'prdlst_nm', ('baseItems', 0, 'value')),
+    'type': ('type', 'PRDLST_DCNM', 'prdlst_dcnm'),
+    'ingredients': ('ingredients', 'RAWMTRL_NM', 'rawmtrl_nm'),
+    'pog_daycnt': ('pog_daycnt', 'POG_DAYCNT'),
+    'volume': ('volume', 'originVolume'),
+    'image_url': ('image_url', ('images', 0)),
+}
+
+def get_product(barcode: str) -> dict | None:
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM product_catalog WHERE barcode = ?", (barcode,))
+    row = cursor.fetchone()
+    db.close_db_connection(conn)
+    if not row:
+        return None
+    return {field: row[field] for field in CATALOG_FIELDS}
+
+def _get_value(record: dict, alias):
+    if isinstance(alias, str):
+        return record.get(alias)
+    value = record
+    for key in alias:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value
+
+def _normalize(record: dict) -> dict | None:
+    product = {}
+    for field, aliases in FIELD_ALIASES.items():
+        value = next((value for value in (_get_value(record, alias) for alias in aliases) if value not in (None, '')), None)
+        product[field] = str(value).strip() if value is not None else None
+    if not product['barcode']:
+        return None
+    return product
+
+def _iter_csv(file):
+    yield from csv.DictReader(file)
+
+def _iter_jsonl(file):
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def _iter_json_array(file):
+    # 파일 전체를 읽지 않고 첫 번째 배열([...])의 원소를 하나씩 읽음
+    # 최상위 배열과 C005 응답 형식({"C005": {"row": [...]}}) 모두 지원
+    # 버퍼는 위치(pos)로 읽고, 읽은 앞부분은 새로 읽어 붙일 때만 잘라냄
+    decoder = json.JSONDecoder()
+    buffer = ''
+    is_eof = False
+    while '[' not in buffer:
+        chunk = file.read(JSON_READ_SIZE)
+        if not chunk:
+            return
+        buffer += chunk
+    pos = buffer.index('[') + 1
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if is_eof:
+                raise
+            chunk = file.read(JSON_READ_SIZE)
+            is_eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield record
+
+def _detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    return 'json'
+
+def _upsert_chunk(rows: list):
+    # 이미 있는 바코드는 새 값이 있는 컬럼만 갱신(여러 출처의 덤프를 순서대로 적재 가능)
+    with db.connection() as conn:
+        conn.executemany(f'''INSERT INTO product_catalog (barcode, {', '.join(CATALOG_FIELDS)})
+                            VALUES (:barcode, {', '.join(':' + field for field in CATALOG_FIELDS)})
+                            ON CONFLICT(barcode) DO UPDATE SET
+                                {', '.join(f"{field} = COALESCE(excluded.{field}, {field})" for field in CATALOG_FIELDS)},
+                                updated_at = datetime('now', '+9 hours')''', rows)
+
+def load_catalog(path: str, file_format: str = None, chunk_size: int = LOAD_CHUNK_SIZE) -> dict:
+    file_format = file_format or _detect_format(path)
+    readers = {'csv': _iter_csv, 'jsonl': _iter_jsonl, 'json': _iter_json_array}
+    result = {'loaded': 0, 'skipped': 0}
+
+    with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+        chunk = []
+        for record in readers[file_format](file):
+            product = _normalize(record) if isinstance(record, dict) else None
+            if not product:
+                result['skipped'] += 1
+                continue
+            chunk.append(product)
+            if len(chunk) >= chunk_size:
+                _upsert_chunk(chunk)
+                result['loaded'] += len(chunk)
+                chunk = []
+                print(f"{result['loaded']} rows loaded...")
+        if chunk:
+            _upsert_chunk(chunk)
+            result['loaded'] += len(chunk)
+
+    return result
+
+# python -m db.catalog <덤프 파일> [--format csv|json|jsonl] [--chunk-size N]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="C005/retaildb 상품 덤프를 product_catalog에 적재합니다.")
+    parser.add_argument('path', help="CSV, JSON 또는 JSON Lines 파일 경로")
+    parser.add_argument('--format', choices=['csv', 'json', 'jsonl'], default=None, help="파일 형식(기본값: 확장자로 판단)")
+    parser.add_argument('--chunk-size', type=int, default=LOAD_CHUNK_SIZE, help="한 트랜잭션에 적재할 행 수")
+    args = parser.parse_args()
+
+    result = load_catalog(args.path, args.format, args.chunk_size)
+    print(f"Done. loaded: {result['loaded']}, skipped: {result['skipped']}")
@@ -1,22 +1,18 @@
-import os
+import base64
 import db
 import db.session
+import db.product
 import src.utils as utils
-import requests
+from src.scheduler import PeriodicTask
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-load_dotenv()
-# import urllib3
-# urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def delete_food(sid: str, fid: str) -> utils.ResultDTO:
-    session_info = db.session.get_info(sid)
+def delete_food(session: 'str | db.session.SessionContext', fid: str) -> utils.ResultDTO:
+    session_info = db.session.get_context(session)
     if not session_info.result:
         return session_info
+    session = session_info.data['session']
     
-    uid = session_info.data['session_info']['uid']
-    
-    food_info = get_info(sid, fid)
+    food_info = get_info(session, fid)
     if not food_info.result:
         return food_info
     
@@ -34,12 +30,10 @@ def delete_food(sid: str, fid: str) -> utils.ResultDTO:
     db.close_db_connection(conn)
     return utils.ResultDTO(code=200, message="성공적으로 삭제되었습니다.", result=True)
 
-def get_info(sid: str, fid: str) -> utils.ResultDTO:
-    session_info = db.session.get_info(sid)
+def get_info(session: 'str | db.session.SessionContext', fid: str) -> utils.ResultDTO:
+    session_info = db.session.get_context(session)
     if not session_info.result:
         return session_info
-    if session_info.data['session_info']['is_active'] == 0:
-        return utils.ResultDTO(code=401, message="비활성화된 세션입니다.", result=False)
 
     if not fid:
         return utils.ResultDTO(code=400, message="유효하지 않은 식품 ID입니다.", result=False)
@@ -48,7 +42,7 @@ def get_info(sid: str, fid: str) -> utils.ResultDTO:
     cursor = conn.cursor()
 
     # 유저 ID와 식품 ID가 일치하는 식품 정보 조회
-    uid = session_info.data['session_info']['uid']
+    uid = session_info.data['session'].uid
     cursor.execute("SELECT * FROM foods WHERE fid = ? AND uid = ?", (fid, uid))
     row = cursor.fetchone()
     
@@ -71,54 +65,352 @@ def get_info(sid: str, fid: str) -> utils.ResultDTO:
     db.close_db_connection(conn)
     return utils.ResultDTO(code=200, message="성공적으로 조회되었습니다.", data={'food_info': row}, result=True)
 
-def get_list_info(sid: str) -> utils.ResultDTO:
-    session_info = db.session.get_info(sid)
+FOOD_COLUMNS = ('fid', 'uid', 'is_active', 'name', 'type', 'ingredients', 'description', 'count', 'volume', 'image_url', 'barcode', 'expiration_date_desc', 'expiration_date', 'updated_at', 'created_at')
+FOOD_LIST_DEFAULT_LIMIT = 100
+FOOD_LIST_MAX_LIMIT = 500
+
+# 유통기한까지 남은 일수(소수점 버림). julianday 차이에 큰 수를 더해 음수도 내림 처리
+DAYS_REMAINING_SQL = "CAST(julianday(expiration_date) - julianday(:now) + 100000 AS INTEGER) - 100000"
+
+def _encode_list_cursor(expiration_date: str, fid: str) -> str:
+    return base64.urlsafe_b64encode(f"{expiration_date}|{fid}".encode()).decode().rstrip('=')
+
+def _decode_list_cursor(list_cursor: str) -> tuple | None:
+    try:
+        expiration_date, fid = base64.urlsafe_b64decode(list_cursor + '=' * (-len(list_cursor) % 4)).decode().split('|')
+        return expiration_date, fid
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def get_list_info(session: 'str | db.session.SessionContext', limit: int = None, list_cursor: str = None,
+                  active_only: bool = True, expiring_within: int = None, food_type: str = None, fields: list = None) -> utils.ResultDTO:
+    # (expiration_date, fid) 순서의 키셋 페이지네이션. 다음 페이지는 next_cursor로 조회
+    session_info = db.session.get_context(session)
     # 잘못된 세션 ID일 경우 실패 처리
     if not session_info.result:
         return session_info
-    if session_info.data['session_info']['is_active'] == 0:
-        return utils.ResultDTO(code=401, message="비활성화된 세션입니다.", result=False)
     
-    uid = session_info.data['session_info']['uid']
+    uid = session_info.data['session'].uid
+    
+    limit = FOOD_LIST_DEFAULT_LIMIT if limit is None else limit
+    if limit <= 0 or limit > FOOD_LIST_MAX_LIMIT:
+        return utils.ResultDTO(code=400, message=f"limit은 1 이상 {FOOD_LIST_MAX_LIMIT} 이하이어야 합니다.", result=False)
+    
+    # 조회할 컬럼. 페이지 위치 계산을 위해 fid, expiration_date는 항상 포함
+    columns = list(FOOD_COLUMNS)
+    if fields:
+        invalid_fields = [field for field in fields if field not in FOOD_COLUMNS]
+        if invalid_fields:
+            return utils.ResultDTO(code=400, message=f"조회할 수 없는 필드입니다: {', '.join(invalid_fields)}", result=False)
+        columns = list(dict.fromkeys(['fid', 'expiration_date', *fields]))
+    
+    conditions = ["uid = :uid"]
+    params = {'uid': uid, 'now': utils.get_current_datetime_str(), 'limit': limit + 1}
+    if active_only:
+        conditions.append("is_active = 1")
+    if expiring_within is not None:
+        conditions.append("expiration_date <= :expiring_until")
+        params['expiring_until'] = utils.get_future_timestamp(days=expiring_within)
+    if food_type:
+        conditions.append("type = :type")
+        params['type'] = food_type
+    if list_cursor:
+        decoded_cursor = _decode_list_cursor(list_cursor)
+        if not decoded_cursor:
+            return utils.ResultDTO(code=400, message="유효하지 않은 cursor입니다.", result=False)
+        conditions.append("(expiration_date, fid) > (:cursor_expiration_date, :cursor_fid)")
+        params['cursor_expiration_date'], params['cursor_fid'] = decoded_cursor
     
     conn = db.get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM foods WHERE uid = ?", (uid,))
+    # 첫 페이지는 변경 기록(/food/changes)의 시작 위치를 함께 반환
+    # 목록보다 먼저 읽어야 두 조회 사이의 변경이 변경 기록 쪽에 남음(중복은 있어도 누락은 없음)
+    change_cursor = None
+    if not list_cursor:
+        cursor.execute("SELECT MAX(seq) FROM change_log WHERE uid = ?", (uid,))
+        change_cursor = cursor.fetchone()[0] or 0
+    
+    cursor.execute(f"""SELECT {', '.join(columns)}, {DAYS_REMAINING_SQL} AS days_remaining
+                       FROM foods WHERE {' AND '.join(conditions)}
+                       ORDER BY expiration_date, fid LIMIT :limit""", params)
     rows = cursor.fetchall()
+    db.close_db_connection(conn)
+    
+    if not rows and not list_cursor:
+        return utils.ResultDTO(code=404, message="등록된 식품 정보가 없습니다.", data={'change_cursor': change_cursor}, result=False)
+    
+    food_list = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = _encode_list_cursor(food_list[-1]['expiration_date'], food_list[-1]['fid'])
+    
+    return utils.ResultDTO(code=200, message="성공적으로 조회되었습니다.", data={'food_list': food_list, 'next_cursor': next_cursor, 'change_cursor': change_cursor}, result=True)
+
+CHANGE_FEED_DEFAULT_LIMIT = 200
+CHANGE_FEED_MAX_LIMIT = 1000
+
+def get_changes(session: 'str | db.session.SessionContext', since: int = None, limit: int = None) -> utils.ResultDTO:
+    # since(마지막으로 받은 seq) 이후의 식품/대화 변경 내역을 seq 순서로 반환
+    # 기준점은 /food/list 첫 페이지의 change_cursor를 사용
+    # since를 생략하면 현재 위치(next_cursor)만 반환. 이 경우 반드시 목록 조회 전에 호출해야 그 사이의 변경이 누락되지 않음
+    session_info = db.session.get_context(session)
+    if not session_info.result:
+        return session_info
+    
+    uid = session_info.data['session'].uid
+    
+    limit = CHANGE_FEED_DEFAULT_LIMIT if limit is None else limit
+    if limit <= 0 or limit > CHANGE_FEED_MAX_LIMIT:
+        return utils.ResultDTO(code=400, message=f"limit은 1 이상 {CHANGE_FEED_MAX_LIMIT} 이하이어야 합니다.", result=False)
+    if since is not None and since < 0:
+        return utils.ResultDTO(code=400, message="유효하지 않은 cursor입니다.", result=False)
+    
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
     
-    if not rows:
+    if since is None:
+        cursor.execute("SELECT MAX(seq) FROM change_log WHERE uid = ?", (uid,))
+        next_cursor = cursor.fetchone()[0] or 0
         db.close_db_connection(conn)
-        return utils.ResultDTO(code=404, message="등록된 식품 정보가 없습니다.", result=False)
+        return utils.ResultDTO(code=200, message="성공적으로 조회되었습니다.", data={'changes': [], 'next_cursor': next_cursor, 'has_more': False}, result=True)
     
-    food_list = [dict(row) for row in rows]
+    cursor.execute("SELECT seq, entity, entity_id, op, created_at FROM change_log WHERE uid = ? AND seq > ? ORDER BY seq LIMIT ?", (uid, since, limit + 1))
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    changes = [dict(row) for row in rows[:limit]]
     
-    # 각 식품의 유통기한까지 남은 일수 계산
-    current_date = datetime.now()
-    for food in food_list:
-        expiration_date = utils.str_to_datetime(food['expiration_date'])
-        days_remaining = (expiration_date - current_date).days
-        food['days_remaining'] = days_remaining
+    # 변경된 항목의 현재 상태를 한 번에 조회
+    fids = list({change['entity_id'] for change in changes if change['entity'] == 'food'})
+    fcids = list({change['entity_id'] for change in changes if change['entity'] == 'food_chat'})
+    foods = {}
+    chats = {}
+    if fids:
+        params = {'uid': uid, 'now': utils.get_current_datetime_str(), **{f'fid{index}': fid for index, fid in enumerate(fids)}}
+        cursor.execute(f"SELECT *, {DAYS_REMAINING_SQL} AS days_remaining FROM foods WHERE uid = :uid AND fid IN ({', '.join(f':fid{index}' for index in range(len(fids)))})", params)
+        foods = {row['fid']: dict(row) for row in cursor.fetchall()}
+    if fcids:
+        cursor.execute(f"SELECT * FROM food_chat WHERE uid = ? AND fcid IN ({', '.join('?' * len(fcids))})", (uid, *fcids))
+        chats = {row['fcid']: dict(row) for row in cursor.fetchall()}
+    db.close_db_connection(conn)
+    
+    for change in changes:
+        if change['entity'] == 'food':
+            change['data'] = foods.get(change['entity_id'])
+        else:
+            change['data'] = chats.get(change['entity_id'])
+    
+    next_cursor = changes[-1]['seq'] if changes else since
+    return utils.ResultDTO(code=200, message="성공적으로 조회되었습니다.", data={'changes': changes, 'next_cursor': next_cursor, 'has_more': has_more}, result=True)
+
+FOOD_SEARCH_DEFAULT_LIMIT = 20
+FOOD_SEARCH_MAX_LIMIT = 100
+FOOD_SEARCH_MIN_FTS_LENGTH = 3   # trigram 토크나이저는 3글자 이상만 색인 검색 가능
+FOOD_SEARCH_COLUMNS = ('name', 'type', 'ingredients', 'description')
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+def search_foods(session: 'str | db.session.SessionContext', query: str, limit: int = None, offset: int = 0) -> utils.ResultDTO:
+    # 이름, 종류, 원재료, 메모에서 검색. 3글자 이상 단어는 FTS5 색인, 더 짧은 단어는 LIKE로 추가 필터링
+    session_info = db.session.get_context(session)
+    if not session_info.result:
+        return session_info
+    
+    uid = session_info.data['session'].uid
     
-    food_list.sort(key=lambda x: x['expiration_date'])
+    terms = (query or '').split()
+    if not terms:
+        return utils.ResultDTO(code=400, message="검색어를 입력해주세요.", result=False)
+    limit = FOOD_SEARCH_DEFAULT_LIMIT if limit is None else limit
+    if limit <= 0 or limit > FOOD_SEARCH_MAX_LIMIT:
+        return utils.ResultDTO(code=400, message=f"limit은 1 이상 {FOOD_SEARCH_MAX_LIMIT} 이하이어야 합니다.", result=False)
+    if offset is None or offset < 0:
+        return utils.ResultDTO(code=400, message="offset은 0 이상이어야 합니다.", result=False)
     
+    fts_terms = [term for term in terms if len(term) >= FOOD_SEARCH_MIN_FTS_LENGTH]
+    like_terms = [term for term in terms if len(term) < FOOD_SEARCH_MIN_FTS_LENGTH]
+    
+    params = {'uid': uid, 'now': utils.get_current_datetime_str(), 'limit': limit + 1, 'offset': offset}
+    conditions = ["f.uid = :uid", "f.is_active = 1"]
+    for index, term in enumerate(like_terms):
+        conditions.append("(" + " OR ".join(f"f.{column} LIKE :like{index} ESCAPE '\\'" for column in FOOD_SEARCH_COLUMNS) + ")")
+        params[f'like{index}'] = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    
+    if fts_terms:
+        params['match'] = f"uid : {_fts_phrase(uid)} AND {{{' '.join(FOOD_SEARCH_COLUMNS)}}} : ({' '.join(_fts_phrase(term) for term in fts_terms)})"
+        sql = f"""SELECT f.*, {DAYS_REMAINING_SQL} AS days_remaining
+                  FROM foods_fts JOIN foods f ON f.rowid = foods_fts.rowid
+                  WHERE foods_fts MATCH :match AND {' AND '.join(conditions)}
+                  ORDER BY bm25(foods_fts, 0.0, 10.0, 5.0, 1.0, 2.0), f.expiration_date
+                  LIMIT :limit OFFSET :offset"""
+    else:
+        sql = f"""SELECT f.*, {DAYS_REMAINING_SQL} AS days_remaining
+                  FROM foods f WHERE {' AND '.join(conditions)}
+                  ORDER BY f.expiration_date, f.fid
+                  LIMIT :limit OFFSET :offset"""
+    
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
     db.close_db_connection(conn)
-    return utils.ResultDTO(code=200, message="성공적으로 조회되었습니다.", data={'food_list': food_list}, result=True)
+    
+    food_list = [dict(row) for row in rows[:limit]]
+    next_offset = offset + limit if len(rows) > limit else None
+    return utils.ResultDTO(code=200, message="성공적으로 조회되었습니다.", data={'food_list': food_list, 'next_offset': next_offset}, result=True)
 
-def regi_food_with_barcode(sid:str, barcode:str, food_count:int) -> utils.ResultDTO:
-    session_info = db.session.get_info(sid)
-    # 잘못된 세션 ID일 경우 실패 처리
+def rebuild_search_index():
+    with db.connection() as conn:
+        conn.execute("INSERT INTO foods_fts (foods_fts) VALUES ('rebuild')")
+
+SUMMARY_BUCKET_DAYS = (3, 7)
+SUMMARY_REFRESH_INTERVAL = 600
+SUMMARY_REFRESH_BATCH_SIZE = 500
+
+# 유저별 기준 날짜(:today)로 유통기한 구간(만료/3일/7일 이내)을 계산. 유저별 (uid, is_active, expiration_date) 인덱스 범위만 셈
+SUMMARY_BUCKETS_SQL = """
+    (SELECT COUNT(*) FROM foods WHERE uid = :uid AND is_active = 1 AND expiration_date < :today),
+    (SELECT COUNT(*) FROM foods WHERE uid = :uid AND is_active = 1 AND expiration_date >= :today AND expiration_date < :d3),
+    (SELECT COUNT(*) FROM foods WHERE uid = :uid AND is_active = 1 AND expiration_date >= :today AND expiration_date < :d7)"""
+
+def _summary_bucket_params(uid: str = None) -> dict:
+    today = utils.get_current_datetime().date()
+    return {
+        'uid': uid,
+        'today': today.isoformat(),
+        'd3': (today + timedelta(days=SUMMARY_BUCKET_DAYS[0])).isoformat(),
+        'd7': (today + timedelta(days=SUMMARY_BUCKET_DAYS[1])).isoformat(),
+        'now': utils.get_current_datetime_str(),
+    }
+
+def get_summary(session: 'str | db.session.SessionContext') -> utils.ResultDTO:
+    # 트리거로 유지되는 food_summary / food_type_summary만 읽으므로 보유 식품 수와 무관하게 즉시 응답
+    session_info = db.session.get_context(session)
     if not session_info.result:
         return session_info
     
+    uid = session_info.data['session'].uid
+    params = _summary_bucket_params(uid)
+    
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT total_items, total_count, expired_items, expiring_3d_items, expiring_7d_items, buckets_date, buckets_updated_at, updated_at FROM food_summary WHERE uid = ?", (uid,))
+    row = cursor.fetchone()
+    summary = dict(row) if row else None
+    if summary and summary['buckets_date'] < params['today']:
+        # 날짜가 바뀐 뒤 아직 재계산되지 않은 유저는 오늘 기준 구간을 직접 셈(저장은 refresh_summary_buckets가 함)
+        cursor.execute(f"SELECT {SUMMARY_BUCKETS_SQL}", params)
+        summary['expired_items'], summary['expiring_3d_items'], summary['expiring_7d_items'] = cursor.fetchone()
+        summary['buckets_updated_at'] = params['now']
+    cursor.execute("SELECT type, items, count FROM food_type_summary WHERE uid = ? AND items > 0 ORDER BY items DESC, type", (uid,))
+    types = [dict(type_row) for type_row in cursor.fetchall()]
+    db.close_db_connection(conn)
+    
+    if summary is None:
+        summary = {'total_items': 0, 'total_count': 0, 'expired_items': 0, 'expiring_3d_items': 0, 'expiring_7d_items': 0, 'buckets_updated_at': None, 'updated_at': None}
+    summary.pop('buckets_date', None)
+    summary['types'] = types
+    
+    return utils.ResultDTO(code=200, message="성공적으로 조회되었습니다.", data={'summary': summary}, result=True)
+
+def refresh_summary_buckets(batch_size: int = SUMMARY_REFRESH_BATCH_SIZE) -> int:
+    # 기준 날짜(buckets_date)가 오늘보다 이전인 유저만 batch_size명씩 다시 계산하고 기준 날짜를 오늘로 옮김
+    # 하루에 한 번, 날짜가 바뀐 뒤 첫 실행에서만 일을 하고 그 외에는 buckets_date 인덱스 조회 한 번으로 끝남
+    # 여러 프로세스가 동시에 실행해도 buckets_date 조건으로 같은 유저를 두 번 계산하지 않음
+    params = _summary_bucket_params()
+    total = 0
+    while True:
+        with db.connection() as conn:
+            rows = conn.execute("SELECT uid FROM food_summary WHERE buckets_date < ? LIMIT ?", (params['today'], batch_size)).fetchall()
+            conn.executemany(f"""
+                UPDATE food_summary SET
+                    (expired_items, expiring_3d_items, expiring_7d_items) = (SELECT {SUMMARY_BUCKETS_SQL}),
+                    buckets_date = :today,
+                    buckets_updated_at = :now
+                WHERE uid = :uid AND buckets_date < :today""", [{**params, 'uid': row['uid']} for row in rows])
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+
+summary_refresher = PeriodicTask('food-summary-refresh', SUMMARY_REFRESH_INTERVAL, refresh_summary_buckets, run_on_start=True)
+
+FOOD_ARCHIVE_JOB_NAME = 'food-archive'
+FOOD_ARCHIVE_INTERVAL = 3600
+FOOD_ARCHIVE_RETENTION_DAYS = 30
+FOOD_ARCHIVE_BATCH_SIZE = 200
+
+def _load_archive_position(run_key: str) -> tuple:
+    # 마지막으로 확인한 (updated_at, rowid) 위치. 대화에서 참조 중이라 남겨 둔 행을 매번 다시 훑지 않도록 job_checkpoint에 저장
+    # 날짜가 바뀌면 처음부터 다시 훑어, 그사이 대화가 삭제되어 참조가 없어진 행도 보관 대상에 포함
+    with db.connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO job_checkpoint (name, run_key) VALUES (?, ?)", (FOOD_ARCHIVE_JOB_NAME, run_key))
+        conn.execute("""
+            UPDATE job_checkpoint SET run_key = ?, cursor = '', processed = 0, updated_at = datetime('now', '+9 hours')
+            WHERE name = ? AND run_key < ?""", (run_key, FOOD_ARCHIVE_JOB_NAME, run_key))
+        row = conn.execute("SELECT cursor FROM job_checkpoint WHERE name = ?", (FOOD_ARCHIVE_JOB_NAME,)).fetchone()
+    if not row['cursor']:
+        return '', 0
+    updated_at, rowid = row['cursor'].rsplit('|', 1)
+    return updated_at, int(rowid)
+
+def archive_deleted_foods(retention_days: int = FOOD_ARCHIVE_RETENTION_DAYS, batch_size: int = FOOD_ARCHIVE_BATCH_SIZE) -> dict:
+    # 삭제 후 보관 기간이 지난 식품을 batch_size개씩 foods_archive로 이동
+    # 대화 기록(food_chat_items)에서 참조 중인 식품은 조회가 가능하도록 foods에 남겨 둠
+    current = utils.get_current_datetime()
+    cutoff = utils.datetime_to_str(current - timedelta(days=retention_days))
+    columns = ', '.join(FOOD_COLUMNS)
+    movable = "is_active = 0 AND NOT EXISTS (SELECT 1 FROM food_chat_items WHERE food_chat_items.fid = foods.fid)"
+    result = {'archived': 0, 'retained': 0}
+    last = _load_archive_position(current.strftime('%Y-%m-%d'))
+    while True:
+        with db.connection() as conn:
+            rows = conn.execute("""
+                SELECT rowid, updated_at FROM foods
+                WHERE is_active = 0 AND updated_at < ? AND (updated_at, rowid) > (?, ?)
+                ORDER BY updated_at, rowid LIMIT ?""", (cutoff, *last, batch_size)).fetchall()
+            if not rows:
+                break
+            rowids = [row['rowid'] for row in rows]
+            placeholders = ', '.join('?' * len(rowids))
+            # 조회 이후 복구/대화 참조가 생긴 행은 제외하도록 조건을 다시 확인
+            conn.execute(f"INSERT OR REPLACE INTO foods_archive ({columns}) SELECT {columns} FROM foods WHERE rowid IN ({placeholders}) AND {movable}", rowids)
+            archived = conn.execute(f"DELETE FROM foods WHERE rowid IN ({placeholders}) AND {movable}", rowids).rowcount
+            last = (rows[-1]['updated_at'], rows[-1]['rowid'])
+            conn.execute("""
+                UPDATE job_checkpoint SET cursor = ?, processed = processed + ?, updated_at = datetime('now', '+9 hours')
+                WHERE name = ?""", (f"{last[0]}|{last[1]}", len(rows), FOOD_ARCHIVE_JOB_NAME))
+        result['archived'] += archived
+        result['retained'] += len(rows) - archived
+        if len(rows) < batch_size:
+            break
+
+    if result['archived']:
+        print(f"[food-archive] Archived {result['archived']} deleted foods ({result['retained']} kept for chat history)")
+    return result
+
+food_archiver = PeriodicTask('food-archive', FOOD_ARCHIVE_INTERVAL, archive_deleted_foods)
+
+FOOD_INSERT_SQL = "INSERT INTO foods (fid, uid, name, type, ingredients, description, count, volume, image_url, barcode, expiration_date_desc, expiration_date) VALUES (:fid, :uid, :name, :type, :ingredients, :description, :count, :volume, :image_url, :barcode, :expiration_date_desc, :expiration_date)"
+# 같은 날짜에 만료되는 활성 식품이 이미 있으면 수량만 증가(ux_foods_active_barcode_day, migration 10)
+FOOD_UPSERT_SQL = FOOD_INSERT_SQL + """
+    ON CONFLICT (uid, barcode, date(expiration_date)) WHERE is_active = 1
+    DO UPDATE SET count = count + excluded.count, updated_at = datetime('now', '+9 hours')
+    RETURNING fid, (fid != :fid) AS is_merged"""
+BULK_REGI_MAX_ITEMS = 50
+
+def _validate_food_item(barcode: str, food_count: int) -> utils.ResultDTO | None:
     # 잘못된 바코드 값일 경우 실패 처리
     if not barcode or not utils.is_valid_barcode(barcode):
         return utils.ResultDTO(code=400, message="유효하지 않은 바코드 형식입니다. (12~13자리 숫자)", result=False)
     
     # 잘못된 식품 수량일 경우 실패 처리
-    if food_count <= 0 or food_count > 100:
+    if food_count is None or food_count <= 0 or food_count > 100:
         return utils.ResultDTO(code=400, message="식품 수량은 1 이상 100 이하이어야 합니다.", result=False)
-    
+    return None
+
+def _build_food_row(uid: str, barcode: str, food_count: int, product: dict | None) -> dict:
     # 식품의 이름, 종류(유탕면, 음료 등), 유통기한 가져오기
     food_name = None
     food_type = "정보 없음"
@@ -126,54 +418,153 @@ def regi_food_with_barcode(sid:str, barcode:str, food_count:int) -> utils.Result
     food_expiration_date_desc = "3개월 이내(유통기한 정보 없음)"
     food_image_url = None
     food_volume = None
-    try:
-        # get Food name, type, expiration date
-        foodsafety_api_url = f"http://openapi.foodsafetykorea.go.kr/api/{os.environ['FOODSAFETYKOREA_API_KEY']}/C005/json/1/100/BAR_CD={barcode}"
-        response = requests.get(foodsafety_api_url)
-        response.raise_for_status()
-        response_json = response.json()
-        row = response_json['C005']['row'][0]
-        food_name = row['PRDLST_NM']
-        food_type = row['PRDLST_DCNM']
-        food_expiration_date = datetime.now() + timedelta(days=utils.extract_months(row['POG_DAYCNT'])*30)
-        food_expiration_date_desc = row['POG_DAYCNT']
-    except:
-        # return utils.ResultDTO(code=400, message="식품 정보를 찾을 수 없습니다.", result=False)
-        pass
+    if product:
+        food_name = product['name']
+        food_type = product['type'] or food_type
+        food_volume = product['volume']
+        food_image_url = product['image_url']
+        months = utils.extract_months(product['pog_daycnt'] or '')
+        if months:
+            food_expiration_date = datetime.now() + timedelta(days=months*30)
+            food_expiration_date_desc = product['pog_daycnt']
     
-    try:
-        retaildb_api_url = f"https://www.retaildb.or.kr/service/product_info/search/{barcode}"
-        response = requests.get(retaildb_api_url, verify=False)
-        response_json = response.json()
-        food_name = response_json['baseItems'][0]['value']
-        food_volume = response_json['originVolume']
-        food_image_url = response_json['images'][0]
-    except:
-        pass
-    
-    # Get Ingredients
-    ingredients = '정보없음'
-    if barcode == "8801043014830": # 농심 신라면
-        ingredients = "면/소맥분(밀:호주산, 미국산), 팜유(말레이시아산), 감자전분(덴마크산), 변성전분, 난각칼슘, 정제염, 이스트조미분, 면류첨가알칼리제(산도조절제), 혼합제제(산도조절제), 올리고녹차풍미액, 비타민B2, 스프류: 복합조미간장분말, 정제염, 버섯풍미분말, 정백당, 비프조미분, 변성전분, 매운탕분말, 사골된장분말, 양파풍미분, 생고추조미분말, 칠리맛조미분, 수육조미분, 포도당, 양념구이조미분, 볶음양념분, 후추가루, 조미양념분, 분말된장, 치킨풍미분말, 마늘추출물분말, 육수조미분말, 5’-리보뉴클레오티드이나트륨, 호박산이나트륨, 양파조미베이스, 장국양념분말, 다시마정미추출분말, 매운맛조미분, 고춧가루, 분말카라멜(카라멜색소, 물엿분말), 생강추출물분말, 조미건백, 건파, 건표고버섯, 건당근, 건청경채, 조미건조홍고추"
-    if barcode == "8801043014847": # 농심 신라면건면
-        ingredients = "면/소맥분(밀:호주산, 미국산), 감자전분(덴마크산), 팜유(말레이시아산), 난각칼슘, 정제염, 이스트조미분, 면류첨가알칼리제(산도조절제), 혼합제제(산도조절제), 올리고녹차풍미액, 비타민B2, 스프류: 복합조미간장분말, 정제염, 버섯풍미분말, 정백당, 비프조미분, 변성전분, 매운탕분말, 사골된장분말, 양파풍미분, 생고추조미분말, 칠리맛조미분, 수육조미분, 포도당, 양념구이조미분, 볶음양념분, 후추가루, 조미양념분, 분말된장, 치킨풍미분말, 마늘추출물분말, 육수조미분말, 5’-리보뉴클레오티드이나트륨, 호박산이나트륨, 양파조미베이스, 장국양념분말, 다시마정미추출분말, 매운맛조미분, 고춧가루, 분말카라멜(카라멜색소, 물엿분말), 생강추출물분말, 조미건백, 건파, 건표고버섯, 건당근, 건청경채, 조미건조홍고추"
-    if barcode == "8801382123446": # 아침햇살
-        ingredients = "정제수, 설탕, 식물혼합농축액(쌀추출액(국산), 현미추출액(국산)), 크림믹스(야자유(인도네시아산, 필리핀산)), 카제인나트륨, 제이인산칼륨, 합성향료(현미향), 비타민C, 자동증자추출물" 
+    # 원재료 정보는 상품 카탈로그(product_catalog)에서 가져옴
+    ingredients = (product or {}).get('ingredients') or '정보없음'
     
+    return {
+        'fid': utils.gen_hash(16),
+        'uid': uid,
+        'name': food_name,
+        'type': food_type,
+        'ingredients': ingredients,
+        'description': f"[메모] {food_name}",
+        'count': food_count,
+        'volume': food_volume,
+        'image_url': food_image_url,
+        'barcode': barcode,
+        'expiration_date_desc': food_expiration_date_desc,
+        'expiration_date': utils.datetime_to_str(food_expiration_date)
+    }
+
+def _merge_food(cursor, food: dict, split_by_expiration: bool = False) -> str | None:
+    # 같은 바코드의 활성 식품에 수량만 더함. 합칠 식품이 없으면 None
+    # split_by_expiration이면 유통기한 날짜가 같은 식품에만 합침
+    if split_by_expiration:
+        cursor.execute("""UPDATE foods SET count = count + :count, updated_at = datetime('now', '+9 hours')
+                          WHERE uid = :uid AND barcode = :barcode AND is_active = 1 AND date(expiration_date) = date(:expiration_date)
+                          RETURNING fid""", food)
+    else:
+        cursor.execute("""UPDATE foods SET count = count + :count, updated_at = datetime('now', '+9 hours')
+                          WHERE fid = (SELECT fid FROM foods WHERE uid = :uid AND barcode = :barcode AND is_active = 1 ORDER BY expiration_date LIMIT 1)
+                          RETURNING fid""", food)
+    row = cursor.fetchone()
+    return row['fid'] if row else None
+
+def _upsert_food(cursor, food: dict, split_by_expiration: bool = False) -> tuple:
+    # 같은 바코드의 활성 식품이 있으면 새 행을 만들지 않고 수량을 합침. (fid, 합쳐졌는지 여부) 반환
+    # split_by_expiration이면 유통기한 날짜가 같은 경우에만 합침
+    if not split_by_expiration:
+        fid = _merge_food(cursor, food)
+        if fid:
+            return fid, True
+    
+    cursor.execute(FOOD_UPSERT_SQL, food)
+    row = cursor.fetchone()
+    return row['fid'], bool(row['is_merged'])
+
+def regi_food_with_barcode(session: 'str | db.session.SessionContext', barcode:str, food_count:int, split_by_expiration: bool = False) -> utils.ResultDTO:
+    session_info = db.session.get_context(session)
+    # 잘못된 세션 ID일 경우 실패 처리
+    if not session_info.result:
+        return session_info
+    session = session_info.data['session']
+    
+    invalid_info = _validate_food_item(barcode, food_count)
+    if invalid_info:
+        return invalid_info
+    
+    food = _build_food_row(session.uid, barcode, food_count, db.product.get_product(barcode))
     
     # DB
-    fid = utils.gen_hash(16)
-    uid = session_info.data['session_info']['uid']
     conn = db.get_db_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute("INSERT INTO foods (fid, uid, name, type, ingredients, description, count, volume, image_url, barcode, expiration_date_desc, expiration_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    (fid, uid, food_name, food_type, ingredients, f"[메모] {food_name}", food_count, food_volume, food_image_url, barcode, food_expiration_date_desc, utils.datetime_to_str(food_expiration_date)))
+        fid, is_merged = _upsert_food(cursor, food, split_by_expiration)
         conn.commit()
         db.close_db_connection(conn)
     except Exception as e:
         db.close_db_connection(conn)
         return utils.ResultDTO(code=409, message=f"등록 중 오류가 발생했습니다: {str(e)}", result=False)
 
-    return utils.ResultDTO(code=200, message="식품 등록 성공", data=get_info(sid, fid).data, result=True)
\ No newline at end of file
+    food_info = get_info(session, fid).data
+    food_info['is_merged'] = is_merged
+    return utils.ResultDTO(code=200, message="식품 등록 성공", data=food_info, result=True)
+
+def regi_foods_with_barcodes(session: 'str | db.session.SessionContext', items: list, split_by_expiration: bool = False) -> utils.ResultDTO:
+    # items: [(barcode, count), ...]. 같은 바코드는 수량을 합쳐 한 번만 등록
+    session_info = db.session.get_context(session)
+    if not session_info.result:
+        return session_info
+    session = session_info.data['session']
+    
+    if not items:
+        return utils.ResultDTO(code=400, message="등록할 바코드 목록이 비어 있습니다.", result=False)
+    if len(items) > BULK_REGI_MAX_ITEMS:
+        return utils.ResultDTO(code=400, message=f"바코드는 한 번에 최대 {BULK_REGI_MAX_ITEMS}개까지 등록할 수 있습니다.", result=False)
+    
+    counts = {}
+    for barcode, food_count in items:
+        counts[barcode] = counts.get(barcode, 0) + (food_count or 0)
+    
+    results = {}
+    valid_barcodes = []
+    for barcode, food_count in counts.items():
+        invalid_info = _validate_food_item(barcode, food_count)
+        if invalid_info:
+            results[barcode] = {'barcode': barcode, 'count': food_count, 'code': invalid_info.code, 'message': invalid_info.message, 'result': False}
+        else:
+            valid_barcodes.append(barcode)
+    
+    # 상품 정보는 동시에 조회
+    products = db.product.get_products(valid_barcodes)
+    foods = [_build_food_row(session.uid, barcode, counts[barcode], products.get(barcode)) for barcode in valid_barcodes]
+    
+    # 모든 식품을 하나의 트랜잭션으로 등록
+    registered = {}   # fid -> (barcode, 합쳐졌는지 여부)
+    if foods:
+        try:
+            with db.connection() as conn:
+                cursor = conn.cursor()
+                for food in foods:
+                    # 상품 정보가 없는 바코드는 이미 등록된 식품에 수량을 합칠 수 있을 때만 성공(단건 등록과 동일)
+                    if not food['name']:
+                        fid = _merge_food(cursor, food, split_by_expiration)
+                        if fid is None:
+                            results[food['barcode']] = {'barcode': food['barcode'], 'count': food['count'], 'code': 404, 'message': "식품 정보를 찾을 수 없습니다.", 'result': False}
+                            continue
+                        registered[fid] = (food['barcode'], True)
+                        continue
+                    fid, is_merged = _upsert_food(cursor, food, split_by_expiration)
+                    registered[fid] = (food['barcode'], is_merged)
+        except Exception as e:
+            return utils.ResultDTO(code=409, message=f"등록 중 오류가 발생했습니다: {str(e)}", result=False)
+    
+    if registered:
+        # 등록된 식품 정보는 한 번에 조회
+        conn = db.get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM foods WHERE fid IN ({', '.join('?' * len(registered))})", list(registered))
+        rows = cursor.fetchall()
+        db.close_db_connection(conn)
+        
+        current_date = datetime.now()
+        for row in rows:
+            food_info = dict(row)
+            food_info['days_remaining'] = (utils.str_to_datetime(food_info['expiration_date']) - current_date).days
+            barcode, is_merged = registered[food_info['fid']]
+            results[barcode] = {'barcode': barcode, 'count': counts[barcode], 'code': 200, 'message': "식품 등록 성공", 'result': True, 'is_merged': is_merged, 'food_info': food_info}
+    
+    item_results = [results[barcode] for barcode in counts]
+    success_count = sum(1 for item in item_results if item['result'])
+    return utils.ResultDTO(code=200, message=f"{success_count}/{len(item_results)}개 식품 등록 성공", data={'results': item_results}, result=True)
@@ -2,49 +2,382 @@ import src.utils as utils
 import db
 import db.session
 import db.food
+import db.recipe
+import os
+import json
 import time
+import queue
+import socket
+import atexit
+from src.scheduler import PeriodicTask
 from openai import OpenAI
 from datetime import datetime
 import threading
 
-class FoodChat:
-    gen_chat_queue = []
-    create_queue = []
-    
+FOOD_CHAT_WORKERS = int(os.environ.get('FOOD_CHAT_WORKERS', 4))
+FOOD_CHAT_QUEUE_SIZE = int(os.environ.get('FOOD_CHAT_QUEUE_SIZE', 100))
+FOOD_CHAT_DRAIN_TIMEOUT = 30
+FOOD_CHAT_POLL_INTERVAL = 2          # 다른 프로세스가 넣은 작업을 확인하는 주기
+FOOD_CHAT_LEASE_SECONDS = 300        # 이 시간 안에 끝나지 않은 작업은 다른 워커가 다시 가져감
+FOOD_CHAT_MAX_ATTEMPTS = 3
+FOOD_CHAT_RETRY_BACKOFF = 10         # 재시도 대기 시간(초) = 시도 횟수 * FOOD_CHAT_RETRY_BACKOFF
+FOOD_CHAT_REAP_INTERVAL = 60
+
+FOOD_CHAT_STREAM_POLL_INTERVAL = 1   # 다른 프로세스에서 생성 중인 대화의 상태를 확인하는 주기
+FOOD_CHAT_STREAM_TIMEOUT = 180
+
+class ChatStreamHub:
+    # 이 프로세스에서 생성 중인 대화의 출력 조각을 스트림 구독자에게 전달
     def __init__(self):
-        # 대화 생성 스레드 시작
-        def chat_generating_thread():
-            while True:
-                if self.gen_chat_queue:
-                    chat_info = self.gen_chat_queue.pop(0)
-                    sid = chat_info['sid']
-                    fcid = chat_info['fcid']
-
-                    result = generate_chat(sid, fcid)
-                    
-                    continue
+        self.lock = threading.Lock()
+        self.streams = {}
+
+    def _get_stream(self, fcid: str) -> dict:
+        return self.streams.setdefault(fcid, {'chunks': [], 'subscribers': [], 'active': False})
+
+    def start(self, fcid: str):
+        with self.lock:
+            stream = self._get_stream(fcid)
+            stream['chunks'] = []
+            stream['active'] = True
+
+    def publish(self, fcid: str, kind: str, text: str = None):
+        # kind: 'delta'(출력 조각), 'done'(저장 완료), 'reset'(재시도 예정), 'error'(실패)
+        with self.lock:
+            stream = self.streams.get(fcid)
+            if stream is None:
+                return
+            if kind == 'delta':
+                stream['chunks'].append(text)
+            else:
+                stream['chunks'] = []
+                stream['active'] = False
+            for subscriber in stream['subscribers']:
+                subscriber.put((kind, text))
+            if not stream['active'] and not stream['subscribers']:
+                del self.streams[fcid]
+
+    def subscribe(self, fcid: str) -> queue.Queue:
+        # 이미 생성된 부분은 한 조각으로 먼저 전달
+        subscriber = queue.Queue()
+        with self.lock:
+            stream = self._get_stream(fcid)
+            if stream['chunks']:
+                subscriber.put(('delta', ''.join(stream['chunks'])))
+            stream['subscribers'].append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, fcid: str, subscriber: queue.Queue):
+        with self.lock:
+            stream = self.streams.get(fcid)
+            if stream is None:
+                return
+            stream['subscribers'].remove(subscriber)
+            if not stream['active'] and not stream['subscribers']:
+                del self.streams[fcid]
+
+chat_stream_hub = ChatStreamHub()
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_chat_events(session: 'db.session.SessionContext', fcid: str):
+    # 대화 생성 결과를 SSE 이벤트로 반환하는 제너레이터
+    # 같은 프로세스에서 생성 중이면 출력 조각을 바로 전달하고, 아니면 DB 상태를 주기적으로 확인해 남은 내용을 전달
+    subscriber = chat_stream_hub.subscribe(fcid)
+    # 이미 완료된 대화는 기다리지 않도록 처음 한 번은 바로 상태 확인
+    subscriber.put(('poll', None))
+    streamed = ''
+    deadline = time.monotonic() + FOOD_CHAT_STREAM_TIMEOUT
+    try:
+        while True:
+            try:
+                kind, text = subscriber.get(timeout=FOOD_CHAT_STREAM_POLL_INTERVAL)
+            except queue.Empty:
+                kind, text = 'poll', None
+            
+            if kind == 'delta':
+                streamed += text
+                yield _sse('delta', {'text': text})
+                continue
+            if kind == 'reset':
+                streamed = ''
+                yield _sse('reset', {})
+                continue
             
-                time.sleep(10)
+            chat_info = get_info(session, fcid)
+            if not chat_info.result:
+                yield _sse('error', {'message': chat_info.message})
+                return
+            chat_info = chat_info.data['chat_info']
+            if chat_info['status'] == 'completed':
+                response = chat_info['response'] or ''
+                if not response.startswith(streamed):
+                    streamed = ''
+                    yield _sse('reset', {})
+                if len(response) > len(streamed):
+                    yield _sse('delta', {'text': response[len(streamed):]})
+                yield _sse('done', {'chat_info': chat_info})
+                return
+            if chat_info['status'] == 'failed' or kind == 'error':
+                yield _sse('error', {'message': "대화 생성에 실패했습니다."})
+                return
+            if time.monotonic() >= deadline:
+                yield _sse('error', {'message': "대화 생성 대기 시간이 초과되었습니다."})
+                return
+            yield ": keep-alive\n\n"
+    finally:
+        chat_stream_hub.unsubscribe(fcid, subscriber)
+
+class RecipeFlights:
+    # 프롬프트 키별로 생성 중인 작업 하나(leader)와 결과를 기다리는 대화 목록(followers)을 관리
+    # - 프로세스 안에서만 합침. 다른 프로세스의 같은 요청은 recipe_cache를 통해서만 결과를 공유
+    # - followers는 leader의 응답으로 완료되며 토큰 사용량은 0으로 기록(사용량은 leader에만 한 번 기록)
+    # - leader가 실패하면 followers는 시도 횟수를 쓰지 않고 큐로 돌아가 각자 다시 처리(release_jobs)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
 
-        threading.Thread(target=chat_generating_thread, daemon=True).start()
+    def join(self, key: str, fcid: str) -> bool:
+        # 처음 들어온 작업이면 True(직접 생성), 이미 생성 중이면 False(결과 대기)
+        with self.lock:
+            if key in self.flights:
+                self.flights[key].append(fcid)
+                return False
+            self.flights[key] = []
+            return True
 
-    def queue_add(self, sid: str, fcid: str):
-        self.gen_chat_queue.append({
-            'sid': sid,
-            'fcid': fcid
-        })
-        food_chat_config(fcid, status='queued')
+    def finish(self, key: str) -> list:
+        with self.lock:
+            return self.flights.pop(key, [])
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'in_flight': len(self.flights), 'followers': sum(len(followers) for followers in self.flights.values())}
+
+recipe_flights = RecipeFlights()
+
+def _job_context(uid: str) -> 'db.session.SessionContext':
+    # 작업은 로그인 세션과 무관하게 처리되어야 하므로 uid만 가진 컨텍스트 사용
+    return db.session.SessionContext(sid='', uid=uid, is_active=True, expires_at='')
+
+class FoodChat:
+    # 대화 생성 작업 큐. 작업은 food_chat_jobs에 저장되어 재시작 후에도 남고, 모든 프로세스의 워커가 함께 처리
+    def __init__(self, workers: int = FOOD_CHAT_WORKERS, maxsize: int = FOOD_CHAT_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self.wakeup = threading.Semaphore(0)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recover_jobs()
+        self.workers = [threading.Thread(target=self._worker, name=f'food-chat-{index}', daemon=True) for index in range(workers)]
+        for worker in self.workers:
+            worker.start()
+        self.reaper = PeriodicTask('food-chat-reaper', FOOD_CHAT_REAP_INTERVAL, self.reap_jobs)
+        atexit.register(self.shutdown)
+
+    def recover_jobs(self) -> int:
+        # 작업 없이 queued/creating 상태로 남은 대화를 다시 큐에 넣음
+        now = time.time()
+        with db.connection() as conn:
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO food_chat_jobs (fcid, uid, enqueued_at, available_at)
+                SELECT fcid, uid, ?, ? FROM food_chat WHERE status IN ('queued', 'creating')""", (now, now))
+            return cursor.rowcount
+
+    def reap_jobs(self) -> int:
+        # 재시도 횟수를 모두 쓴 뒤 임대 기간이 지난 작업은 실패 처리
+        with db.connection() as conn:
+            rows = conn.execute("""
+                UPDATE food_chat_jobs SET status = 'failed', lease_owner = NULL, updated_at = datetime('now', '+9 hours')
+                WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?
+                RETURNING fcid""", (time.time(), FOOD_CHAT_MAX_ATTEMPTS)).fetchall()
+            conn.executemany("UPDATE food_chat SET status = 'failed', updated_at = CURRENT_TIMESTAMP WHERE fcid = ?", [(row['fcid'],) for row in rows])
+        return len(rows)
+
+    def claim_job(self) -> dict | None:
+        # 실행 가능한 작업 하나를 한 문장으로 임대. 여러 프로세스가 동시에 가져가도 한 곳에만 배정됨
+        now = time.time()
+        with db.connection() as conn:
+            # 가져갈 작업이 없을 때는 쓰기 잠금을 잡지 않도록 먼저 읽기로 확인
+            ready = conn.execute("""
+                SELECT EXISTS (SELECT 1 FROM food_chat_jobs WHERE status = 'queued' AND available_at <= :now)
+                    OR EXISTS (SELECT 1 FROM food_chat_jobs WHERE status = 'running' AND lease_expires_at < :now AND attempts < :max_attempts)""",
+                {'now': now, 'max_attempts': FOOD_CHAT_MAX_ATTEMPTS}).fetchone()[0]
+            if not ready:
+                return None
+            row = conn.execute("""
+                UPDATE food_chat_jobs SET
+                    status = 'running', attempts = attempts + 1, lease_owner = :owner, lease_expires_at = :lease,
+                    updated_at = datetime('now', '+9 hours')
+                WHERE fcid = COALESCE(
+                    (SELECT fcid FROM food_chat_jobs WHERE status = 'queued' AND available_at <= :now ORDER BY available_at LIMIT 1),
+                    (SELECT fcid FROM food_chat_jobs WHERE status = 'running' AND lease_expires_at < :now AND attempts < :max_attempts LIMIT 1)
+                )
+                RETURNING fcid, uid, attempts, enqueued_at, use_cache""",
+                {'owner': self.owner, 'lease': now + FOOD_CHAT_LEASE_SECONDS, 'now': now, 'max_attempts': FOOD_CHAT_MAX_ATTEMPTS}).fetchone()
+        return dict(row) if row else None
+
+    def finish_job(self, job: dict, error: str = None) -> bool:
+        # 성공한 작업은 삭제하고, 실패한 작업은 재시도 횟수가 남았으면 잠시 뒤 다시 실행. 재시도 여부 반환
+        # 임대 기간이 지나 다른 워커가 가져간 작업이면 아무것도 바꾸지 않음
+        with db.connection() as conn:
+            if error is None:
+                conn.execute("DELETE FROM food_chat_jobs WHERE fcid = ? AND lease_owner = ?", (job['fcid'], self.owner))
+                return False
+            retrying = job['attempts'] < FOOD_CHAT_MAX_ATTEMPTS
+            if retrying:
+                cursor = conn.execute("""
+                    UPDATE food_chat_jobs SET status = 'queued', available_at = ?, lease_owner = NULL, lease_expires_at = NULL,
+                        last_error = ?, updated_at = datetime('now', '+9 hours')
+                    WHERE fcid = ? AND lease_owner = ?""", (time.time() + job['attempts'] * FOOD_CHAT_RETRY_BACKOFF, error, job['fcid'], self.owner))
+            else:
+                cursor = conn.execute("""
+                    UPDATE food_chat_jobs SET status = 'failed', lease_owner = NULL, last_error = ?, updated_at = datetime('now', '+9 hours')
+                    WHERE fcid = ? AND lease_owner = ?""", (error, job['fcid'], self.owner))
+            if cursor.rowcount:
+                conn.execute("UPDATE food_chat SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE fcid = ?", ('queued' if retrying else 'failed', job['fcid']))
+            return retrying
+
+    def complete_jobs(self, fcids: list):
+        # 다른 작업의 결과로 완료된 작업 삭제
+        with db.connection() as conn:
+            conn.executemany("DELETE FROM food_chat_jobs WHERE fcid = ? AND lease_owner = ?", [(fcid, self.owner) for fcid in fcids])
+        with self.lock:
+            self.processed += len(fcids)
+
+    def release_jobs(self, fcids: list):
+        # 합류했던 작업을 시도 횟수 차감 없이 바로 다시 실행 가능하게 되돌림
+        with db.connection() as conn:
+            for fcid in fcids:
+                cursor = conn.execute("""
+                    UPDATE food_chat_jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), available_at = ?,
+                        lease_owner = NULL, lease_expires_at = NULL, updated_at = datetime('now', '+9 hours')
+                    WHERE fcid = ? AND lease_owner = ?""", (time.time(), fcid, self.owner))
+                if cursor.rowcount:
+                    conn.execute("UPDATE food_chat SET status = 'queued', updated_at = CURRENT_TIMESTAMP WHERE fcid = ?", (fcid,))
+        for _ in fcids:
+            self.notify()
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            try:
+                job = self.claim_job()
+            except Exception as e:
+                print(f"[food-chat] Failed to claim job: {e}")
+                job = None
+            if job is None:
+                self.wakeup.acquire(timeout=FOOD_CHAT_POLL_INTERVAL)
+                continue
+
+            wait = time.time() - job['enqueued_at']
+            with self.lock:
+                self.in_flight += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            error = None
+            try:
+                result = generate_chat(_job_context(job['uid']), job['fcid'], claimed=True, use_cache=bool(job['use_cache']))
+                # 대화가 삭제되었거나 이미 완료된 경우는 다시 시도하지 않음
+                if not result.result and result.code >= 500:
+                    error = result.message
+                # 같은 레시피를 생성 중인 작업에 합류한 경우 작업은 그 작업이 끝날 때 함께 정리
+                if result.code == 202:
+                    with self.lock:
+                        self.in_flight -= 1
+                        self.coalesced += 1
+                    continue
+            except Exception as e:
+                error = str(e)
+            try:
+                retrying = self.finish_job(job, error)
+            except Exception as e:
+                print(f"[food-chat] Failed to finish job {job['fcid']}: {e}")
+                retrying = True
+            with self.lock:
+                self.in_flight -= 1
+                self.processed += 1
+                if error is not None:
+                    if retrying:
+                        self.retried += 1
+                    else:
+                        self.failed += 1
+
+    def queued_count(self) -> int:
+        conn = db.get_db_connection()
+        count = conn.execute("SELECT COUNT(*) FROM food_chat_jobs WHERE status = 'queued'").fetchone()[0]
+        db.close_db_connection(conn)
+        return count
+
+    def is_full(self) -> bool:
+        return self.stop_event.is_set() or self.queued_count() >= self.maxsize
+
+    def queue_add(self, conn, uid: str, fcid: str, use_cache: bool = True):
+        # 호출한 쪽의 트랜잭션 안에서 작업 추가. 커밋 후 notify() 호출
+        now = time.time()
+        conn.execute("INSERT INTO food_chat_jobs (fcid, uid, enqueued_at, available_at, use_cache) VALUES (?, ?, ?, ?, ?)", (fcid, uid, now, now, use_cache))
+        with self.lock:
+            self.enqueued += 1
+
+    def notify(self):
+        self.wakeup.release()
+
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    def stats(self) -> dict:
+        conn = db.get_db_connection()
+        depth = {row['status']: row['count'] for row in conn.execute("SELECT status, COUNT(*) AS count FROM food_chat_jobs GROUP BY status")}
+        db.close_db_connection(conn)
+        with self.lock:
+            started = self.processed + self.in_flight
+            return {
+                'workers': len(self.workers),
+                'depth': depth.get('queued', 0),
+                'running': depth.get('running', 0),
+                'dead': depth.get('failed', 0),
+                'maxsize': self.maxsize,
+                'in_flight': self.in_flight,
+                'enqueued': self.enqueued,
+                'rejected': self.rejected,
+                'processed': self.processed,
+                'retried': self.retried,
+                'coalesced': self.coalesced,
+                'failed': self.failed,
+                'avg_wait': self.total_wait / started if started else 0.0,
+                'max_wait': self.max_wait,
+            }
+
+    def shutdown(self, timeout: float = FOOD_CHAT_DRAIN_TIMEOUT):
+        # 새 작업은 가져가지 않고 처리 중인 작업만 마무리. 남은 작업은 큐에 그대로 두어 다음 실행에서 처리
+        if self.stop_event.is_set():
+            return
+        self.stop_event.set()
+        self.reaper.stop()
+        for _ in self.workers:
+            self.wakeup.release()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.join(max(deadline - time.monotonic(), 0))
 
 foodchat_service = FoodChat()
 
-def get_info(sid: str, fcid: str) -> utils.ResultDTO:
-    session_info = db.session.get_info(sid)
+def get_info(session: 'str | db.session.SessionContext', fcid: str) -> utils.ResultDTO:
+    session_info = db.session.get_context(session)
     if not session_info.result:
         return session_info
-    if session_info.data['session_info']['is_active'] == 0:
-        return utils.ResultDTO(code=401, message="비활성화된 세션입니다.", result=False)
     
-    uid = session_info.data['session_info']['uid']
+    uid = session_info.data['session'].uid
     
     conn = db.get_db_connection()
     cursor = conn.cursor()
@@ -69,14 +402,12 @@ def get_info(sid: str, fcid: str) -> utils.ResultDTO:
     
     return utils.ResultDTO(code=200, message="성공적으로 조회했습니다.", data={'chat_info': row, 'food_ids': food_ids}, result=True)
 
-def get_list_info(sid: str) -> utils.ResultDTO:
-    session_info = db.session.get_info(sid)
+def get_list_info(session: 'str | db.session.SessionContext') -> utils.ResultDTO:
+    session_info = db.session.get_context(session)
     if not session_info.result:
         return session_info
-    if session_info.data['session_info']['is_active'] == 0:
-        return utils.ResultDTO(code=401, message="비활성화된 세션입니다.", result=False)
     
-    uid = session_info.data['session_info']['uid']
+    uid = session_info.data['session'].uid
     
     conn = db.get_db_connection()
     cursor = conn.cursor()
@@ -106,13 +437,12 @@ def get_list_info(sid: str) -> utils.ResultDTO:
     
     return utils.ResultDTO(code=200, message="성공적으로 조회했습니다.", data={'chat_list': chat_list}, result=True)
 
-def create_chat_db(sid: str, fid_list: list) -> utils.ResultDTO:
-    session_info = db.session.get_info(sid)
+def create_chat_db(session: 'str | db.session.SessionContext', fid_list: list, use_cache: bool = True) -> utils.ResultDTO:
+    session_info = db.session.get_context(session)
     if not session_info.result:
         return session_info
-    if session_info.data['session_info']['is_active'] == 0:
-        return utils.ResultDTO(code=401, message="비활성화된 세션입니다.", result=False)
-    uid = session_info.data['session_info']['uid']
+    session = session_info.data['session']
+    uid = session.uid
     
     if not fid_list:
         return utils.ResultDTO(code=400, message="식품 ID 목록이 비어 있습니다.", result=False)
@@ -123,7 +453,7 @@ def create_chat_db(sid: str, fid_list: list) -> utils.ResultDTO:
     
     food_info_list = []
     for index, fid in enumerate(fid_list):
-        food_info = db.food.get_info(sid, fid)
+        food_info = db.food.get_info(session, fid)
         if not food_info.result:
             food_info.message = f"식품 ID 조회에 실패했습니다: [{index}] {food_info.message}"
             return food_info
@@ -132,23 +462,28 @@ def create_chat_db(sid: str, fid_list: list) -> utils.ResultDTO:
             continue
         food_info_list.append(food_info.data['food_info'])
 
-    # 대화 생성
-    con = db.get_db_connection()
-    cursor = con.cursor()
-    ## food_chat 테이블 데이터 삽입
-    fcid = utils.gen_hash(16)
-    cursor.execute('''INSERT INTO food_chat (fcid, uid) VALUES (?, ?)''', (fcid, uid))
-    con.commit()
-    for food_info in food_info_list:
-        cursor.execute('''INSERT INTO food_chat_items (fcid, fid) VALUES (?, ?)''', (fcid, food_info['fid']))
-    con.commit()
-    
-    db.close_db_connection(con)
+    # 같은 식품 구성과 식사 시간대의 레시피가 캐시에 있으면 생성 작업 없이 바로 완료(토큰 사용량 0)
+    cached_response = db.recipe.get_cached_recipe(db.recipe.get_key(food_info_list, datetime.now())) if use_cache else None
     
-    # add to queue
-    foodchat_service.queue_add(sid, fcid)
+    # 대기열이 가득 찬 경우 대화를 만들지 않고 바로 거절
+    if cached_response is None and foodchat_service.is_full():
+        foodchat_service.reject()
+        return utils.ResultDTO(code=503, message="대화 생성 요청이 많습니다. 잠시 후 다시 시도해주세요.", result=False)
+
+    # 대화와 생성 작업을 한 트랜잭션으로 저장
+    fcid = utils.gen_hash(16)
+    with db.connection() as conn:
+        if cached_response is None:
+            conn.execute('''INSERT INTO food_chat (fcid, uid, status) VALUES (?, ?, 'queued')''', (fcid, uid))
+        else:
+            conn.execute('''INSERT INTO food_chat (fcid, uid, status, response) VALUES (?, ?, 'completed', ?)''', (fcid, uid, cached_response))
+        conn.executemany('''INSERT INTO food_chat_items (fcid, fid) VALUES (?, ?)''', [(fcid, food_info['fid']) for food_info in food_info_list])
+        if cached_response is None:
+            foodchat_service.queue_add(conn, uid, fcid, use_cache)
+    if cached_response is None:
+        foodchat_service.notify()
     
-    return utils.ResultDTO(code=200, message="대화 정보가 성공적으로 생성되었습니다.", data=get_info(sid, fcid).data, result=True)
+    return utils.ResultDTO(code=200, message="대화 정보가 성공적으로 생성되었습니다.", data=get_info(session, fcid).data, result=True)
 
 def food_chat_config(fcid: str, status: str = None, response: str = None, usage_input_tokens: int = None, usage_output_tokens: int = None) -> utils.ResultDTO:
     # None 값이 아닌 경우에만 업데이트
@@ -179,20 +514,20 @@ def food_chat_config(fcid: str, status: str = None, response: str = None, usage_
 
     return utils.ResultDTO(code=200, message="설정이 성공적으로 업데이트되었습니다.", result=True)
 
-def generate_chat(sid: str, fcid: str) -> utils.ResultDTO:
-    session_info = db.session.get_info(sid)
+def generate_chat(session: 'str | db.session.SessionContext', fcid: str, claimed: bool = False, use_cache: bool = True) -> utils.ResultDTO:
+    # claimed: 작업 큐에서 가져온 작업. 재시도일 수 있으므로 'creating' 상태도 진행하고, 실패 처리는 작업 큐에 맡김
+    # use_cache: False면 캐시된 레시피를 사용하지 않고 새로 생성(생성 결과는 캐시에 저장)
+    session_info = db.session.get_context(session)
     if not session_info.result:
         return session_info
-    if session_info.data['session_info']['is_active'] == 0:
-        return utils.ResultDTO(code=401, message="비활성화된 세션입니다.", result=False)
-    uid = session_info.data['session_info']['uid']
+    session = session_info.data['session']
     
-    food_chat_info = get_info(sid, fcid)
+    food_chat_info = get_info(session, fcid)
     if not food_chat_info.result:
         return food_chat_info
     
     chat_info = food_chat_info.data['chat_info']
-    if chat_info['status'] == 'creating':
+    if chat_info['status'] == 'creating' and not claimed:
         return utils.ResultDTO(code=400, message="생성 중인 대화입니다.", result=False)
     elif chat_info['status'] == 'completed':
         return utils.ResultDTO(code=400, message="이미 완료된 대화입니다.", result=False)
@@ -201,14 +536,29 @@ def generate_chat(sid: str, fcid: str) -> utils.ResultDTO:
     
     food_info_list = []
     for fid in food_chat_info.data['food_ids']:
-        food_info = db.food.get_info(sid, fid)
+        food_info = db.food.get_info(session, fid)
         food_info_list.append(food_info.data['food_info'])
     
+    datetime_now = datetime.now()
+    cache_key = db.recipe.get_key(food_info_list, datetime_now)
+    # 대기하는 동안 같은 레시피가 생성되었으면 그대로 사용
+    if use_cache:
+        cached_response = db.recipe.get_cached_recipe(cache_key)
+        if cached_response is not None:
+            food_chat_config(fcid, status='completed', response=cached_response, usage_input_tokens=0, usage_output_tokens=0)
+            chat_stream_hub.publish(fcid, 'done')
+            return utils.ResultDTO(code=200, message="대화가 성공적으로 생성되었습니다.", data=get_info(session, fcid).data, result=True)
+    
+    # 같은 프롬프트를 이 프로세스에서 이미 생성 중이면 합류하고 워커는 바로 반환. 결과는 먼저 시작한 작업이 채워 줌
+    if claimed and not recipe_flights.join(cache_key, fcid):
+        food_chat_config(fcid, status='creating')
+        return utils.ResultDTO(code=202, message="같은 레시피를 생성 중인 작업에 합류했습니다.", result=True)
+    
+    output_text = None
     try:
         food_chat_config(fcid, status='creating')
         
         client = OpenAI()
-        datetime_now = datetime.now()
         
         prompt = f'''선택된 식품 정보로 레시피 추천을 생성.
         선택된 식품 정보로만 되도록 레시피를 생성하되, 레시피 생성이 어려울 경우 1~2개 정도는 선택된 식품 정보에 없는 식품 추가 가능.
@@ -231,7 +581,9 @@ def generate_chat(sid: str, fcid: str) -> utils.ResultDTO:
         for food_info in food_info_list:
             prompt += f"\n- {food_info['name']}(용량: {food_info['volume']}, 식품 유형: {food_info['type']})"
         
-        response = client.responses.create(
+        # 출력 조각을 받는 대로 구독 중인 스트림(/food/chat/stream)에 전달
+        chat_stream_hub.start(fcid)
+        stream = client.responses.create(
             model="gpt-4.1-nano",
             input=[
                 {
@@ -239,14 +591,48 @@ def generate_chat(sid: str, fcid: str) -> utils.ResultDTO:
                     "content": prompt,
                 },
             ],
+            stream=True,
         )
         
+        response = None
+        for event in stream:
+            if event.type == 'response.output_text.delta':
+                chat_stream_hub.publish(fcid, 'delta', event.delta)
+            elif event.type == 'response.completed':
+                response = event.response
+            elif event.type in ('response.failed', 'response.incomplete', 'error'):
+                raise RuntimeError(f"응답 생성이 중단되었습니다: {event.type}")
+        if response is None:
+            raise RuntimeError("응답이 완료되지 않았습니다.")
+        
         output_text = response.output_text
         input_tokens = response.usage.input_tokens
         output_tokens = response.usage.output_tokens
         food_chat_config(fcid, status='completed', response=output_text, usage_input_tokens=input_tokens, usage_output_tokens=output_tokens)
+        db.recipe.set_cached_recipe(cache_key, output_text)
+        chat_stream_hub.publish(fcid, 'done')
         
-        return utils.ResultDTO(code=200, message="대화가 성공적으로 생성되었습니다.", data=get_info(sid, fcid).data, result=True)
+        return utils.ResultDTO(code=200, message="대화가 성공적으로 생성되었습니다.", data=get_info(session, fcid).data, result=True)
     except Exception as e:
+        # 작업 큐에서 재시도할 수 있으므로 구독자에게는 지금까지 받은 내용을 버리도록 알림
+        chat_stream_hub.publish(fcid, 'reset' if claimed else 'error', str(e))
+        if claimed:
+            raise
         food_chat_config(fcid, status='failed') 
-        return utils.ResultDTO(code=500, message=f"대화 생성 중 오류가 발생했습니다: {str(e)}", result=False)
\ No newline at end of file
+        return utils.ResultDTO(code=500, message=f"대화 생성 중 오류가 발생했습니다: {str(e)}", result=False)
+    finally:
+        if claimed:
+            _finish_flight(cache_key, output_text)
+
+def _finish_flight(cache_key: str, output_text: str | None):
+    # 합류한 대화는 토큰 사용량 0으로 같은 결과를 저장. 생성에 실패했으면 각자 다시 큐에서 처리
+    followers = recipe_flights.finish(cache_key)
+    if not followers:
+        return
+    if output_text is None:
+        foodchat_service.release_jobs(followers)
+        return
+    for follower_fcid in followers:
+        food_chat_config(follower_fcid, status='completed', response=output_text, usage_input_tokens=0, usage_output_tokens=0)
+        chat_stream_hub.publish(follower_fcid, 'done')
+    foodchat_service.complete_jobs(followers)
\ No newline at end of file
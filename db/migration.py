@@ -0,0 +1,545 @@
+import sqlite3
+import db
+
+# 번호가 붙은 스키마 변경 목록. PRAGMA user_version에 마지막으로 적용된 번호를 기록하고
+# 아직 적용되지 않은 항목만 순서대로 실행한다. 항목은 SQL 스크립트 또는 conn을 받는 함수.
+# 이미 배포된 항목은 수정하지 말고 새 번호로 추가할 것.
+MIGRATIONS = [
+    (1, "기본 테이블 생성", '''
+        CREATE TABLE IF NOT EXISTS email_verification (
+            email TEXT PRIMARY KEY,
+            verification_code TEXT NOT NULL,
+            is_verified BOOLEAN NOT NULL DEFAULT 0,
+            try_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours'))
+        );
+
+        CREATE TABLE IF NOT EXISTS users (
+            uid TEXT PRIMARY KEY,
+            email TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            salt TEXT NOT NULL,
+            name TEXT NOT NULL,
+            profile_url TEXT DEFAULT NULL,
+            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            FOREIGN KEY (email) REFERENCES email_verification(email)
+        );
+
+        CREATE TABLE IF NOT EXISTS user_password_find_link (
+            email TEXT NOT NULL,
+            link_hash TEXT NOT NULL,
+            is_used BOOLEAN NOT NULL DEFAULT FALSE,
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            update_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+
+            FOREIGN KEY (email) REFERENCES email_verification(email)
+        );
+
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            sid TEXT PRIMARY KEY,
+            uid TEXT NOT NULL,
+            user_agent TEXT NOT NULL,
+            ip_address TEXT NOT NULL,
+            is_active BOOLEAN NOT NULL DEFAULT 1,
+            last_accessed TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            update_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            FOREIGN KEY (uid) REFERENCES users(uid)
+        );
+
+        CREATE TABLE IF NOT EXISTS user_session_deactive_link (
+            sid TEXT PRIMARY KEY,
+            link_hash TEXT NOT NULL,
+            is_used BOOLEAN NOT NULL DEFAULT FALSE,
+            update_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+
+            FOREIGN KEY (sid) REFERENCES user_sessions(sid)
+        );
+
+        CREATE TABLE IF NOT EXISTS foods (
+            fid TEXT PRIMARY KEY,
+            uid TEXT NOT NULL,
+            is_active BOOLEAN NOT NULL DEFAULT 1,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            ingredients TEXT DEFAULT '정보없음',
+            description TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            volume TEXT DEFAULT NULL,
+            image_url TEXT DEFAULT NULL,
+            barcode TEXT NOT NULL,
+            expiration_date_desc TEXT,
+            expiration_date DATE NOT NULL,
+            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            FOREIGN KEY (uid) REFERENCES users(uid)
+        );
+
+        CREATE TABLE IF NOT EXISTS food_chat (
+            fcid TEXT PRIMARY KEY,
+            uid TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'created',
+            response TEXT DEFAULT NULL,
+            usage_input_token INTEGER NOT NULL DEFAULT 0,
+            usage_output_token INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            FOREIGN KEY (uid) REFERENCES users(uid)
+        );
+        CREATE TABLE IF NOT EXISTS food_chat_items (
+            fcid TEXT NOT NULL,
+            fid TEXT NOT NULL,
+            FOREIGN KEY (fcid) REFERENCES food_chat(fcid),
+            FOREIGN KEY (fid) REFERENCES foods(fid),
+            PRIMARY KEY (fcid, fid)
+        );
+    '''),
+    (2, "조회 경로별 보조 인덱스 추가", '''
+        CREATE INDEX IF NOT EXISTS idx_user_sessions_uid_created ON user_sessions (uid, created_at);
+        CREATE INDEX IF NOT EXISTS idx_foods_uid_active_expiration ON foods (uid, is_active, expiration_date);
+        CREATE INDEX IF NOT EXISTS idx_food_chat_uid_created ON food_chat (uid, created_at);
+        CREATE INDEX IF NOT EXISTS idx_food_chat_items_fid ON food_chat_items (fid);
+        CREATE INDEX IF NOT EXISTS idx_password_find_link_hash ON user_password_find_link (link_hash);
+        CREATE INDEX IF NOT EXISTS idx_password_find_link_email_used ON user_password_find_link (email, is_used);
+        CREATE INDEX IF NOT EXISTS idx_session_deactive_link_hash ON user_session_deactive_link (link_hash);
+    '''),
+    (3, "만료 세션 정리용 인덱스 추가", '''
+        CREATE INDEX IF NOT EXISTS idx_user_sessions_active_expires ON user_sessions (is_active, expires_at);
+        CREATE INDEX IF NOT EXISTS idx_session_deactive_link_used ON user_session_deactive_link (is_used, update_at);
+    '''),
+    (4, "세션 토큰 세대 번호 추가", '''
+        ALTER TABLE users ADD COLUMN session_generation INTEGER NOT NULL DEFAULT 0;
+    '''),
+    (5, "바코드 상품 정보 캐시 테이블 추가", '''
+        CREATE TABLE IF NOT EXISTS product_cache (
+            barcode TEXT PRIMARY KEY,
+            is_found BOOLEAN NOT NULL DEFAULT 1,
+            name TEXT DEFAULT NULL,
+            type TEXT DEFAULT NULL,
+            pog_daycnt TEXT DEFAULT NULL,
+            volume TEXT DEFAULT NULL,
+            image_url TEXT DEFAULT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours'))
+        );
+    '''),
+    (6, "오프라인 상품 카탈로그 테이블 추가", '''
+        CREATE TABLE IF NOT EXISTS product_catalog (
+            barcode TEXT PRIMARY KEY,
+            name TEXT DEFAULT NULL,
+            type TEXT DEFAULT NULL,
+            ingredients TEXT DEFAULT NULL,
+            pog_daycnt TEXT DEFAULT NULL,
+            volume TEXT DEFAULT NULL,
+            image_url TEXT DEFAULT NULL,
+            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours'))
+        ) WITHOUT ROWID;
+
+        -- 기존에 코드로 관리하던 원재료 정보
+        INSERT OR IGNORE INTO product_catalog (barcode, ingredients) VALUES ('8801043014830', '면/소맥분(밀:호주산, 미국산), 팜유(말레이시아산), 감자전분(덴마크산), 변성전분, 난각칼슘, 정제염, 이스트조미분, 면류첨가알칼리제(산도조절제), 혼합제제(산도조절제), 올리고녹차풍미액, 비타민B2, 스프류: 복합조미간장분말, 정제염, 버섯풍미분말, 정백당, 비프조미분, 변성전분, 매운탕분말, 사골된장분말, 양파풍미분, 생고추조미분말, 칠리맛조미분, 수육조미분, 포도당, 양념구이조미분, 볶음양념분, 후추가루, 조미양념분, 분말된장, 치킨풍미분말, 마늘추출물분말, 육수조미분말, 5’-리보뉴클레오티드이나트륨, 호박산이나트륨, 양파조미베이스, 장국양념분말, 다시마정미추출분말, 매운맛조미분, 고춧가루, 분말카라멜(카라멜색소, 물엿분말), 생강추출물분말, 조미건백, 건파, 건표고버섯, 건당근, 건청경채, 조미건조홍고추'); -- 농심 신라면
+        INSERT OR IGNORE INTO product_catalog (barcode, ingredients) VALUES ('8801043014847', '면/소맥분(밀:호주산, 미국산), 감자전분(덴마크산), 팜유(말레이시아산), 난각칼슘, 정제염, 이스트조미분, 면류첨가알칼리제(산도조절제), 혼합제제(산도조절제), 올리고녹차풍미액, 비타민B2, 스프류: 복합조미간장분말, 정제염, 버섯풍미분말, 정백당, 비프조미분, 변성전분, 매운탕분말, 사골된장분말, 양파풍미분, 생고추조미분말, 칠리맛조미분, 수육조미분, 포도당, 양념구이조미분, 볶음양념분, 후추가루, 조미양념분, 분말된장, 치킨풍미분말, 마늘추출물분말, 육수조미분말, 5’-리보뉴클레오티드이나트륨, 호박산이나트륨, 양파조미베이스, 장국양념분말, 다시마정미추출분말, 매운맛조미분, 고춧가루, 분말카라멜(카라멜색소, 물엿분말), 생강추출물분말, 조미건백, 건파, 건표고버섯, 건당근, 건청경채, 조미건조홍고추'); -- 농심 신라면건면
+        INSERT OR IGNORE INTO product_catalog (barcode, ingredients) VALUES ('8801382123446', '정제수, 설탕, 식물혼합농축액(쌀추출액(국산), 현미추출액(국산)), 크림믹스(야자유(인도네시아산, 필리핀산)), 카제인나트륨, 제이인산칼륨, 합성향료(현미향), 비타민C, 자동증자추출물'); -- 아침햇살
+    '''),
+    (7, "유저별 데이터 버전(ETag) 테이블과 트리거 추가", '''
+        CREATE TABLE IF NOT EXISTS user_data_version (
+            uid TEXT NOT NULL,
+            resource TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (uid, resource)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trg_foods_version_insert AFTER INSERT ON foods BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (NEW.uid, 'food', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_foods_version_update AFTER UPDATE ON foods BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (NEW.uid, 'food', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_foods_version_delete AFTER DELETE ON foods BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (OLD.uid, 'food', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_food_chat_version_insert AFTER INSERT ON food_chat BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (NEW.uid, 'food_chat', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_food_chat_version_update AFTER UPDATE ON food_chat BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (NEW.uid, 'food_chat', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_food_chat_version_delete AFTER DELETE ON food_chat BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (OLD.uid, 'food_chat', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_user_sessions_version_insert AFTER INSERT ON user_sessions BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (NEW.uid, 'session', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_user_sessions_version_update AFTER UPDATE ON user_sessions BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (NEW.uid, 'session', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_user_sessions_version_delete AFTER DELETE ON user_sessions BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (OLD.uid, 'session', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_food_chat_items_version_insert AFTER INSERT ON food_chat_items BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES ((SELECT uid FROM food_chat WHERE fcid = NEW.fcid), 'food_chat', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+    '''),
+    (8, "식품/대화 변경 기록(change_log) 테이블과 트리거 추가", '''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            uid TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            op TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_change_log_uid_seq ON change_log (uid, seq);
+
+        CREATE TRIGGER IF NOT EXISTS trg_foods_change_insert AFTER INSERT ON foods BEGIN
+            INSERT INTO change_log (uid, entity, entity_id, op) VALUES (NEW.uid, 'food', NEW.fid, 'insert');
+        END;
+        -- delete_food는 is_active만 FALSE로 바꾸므로 삭제로 기록
+        CREATE TRIGGER IF NOT EXISTS trg_foods_change_update AFTER UPDATE ON foods BEGIN
+            INSERT INTO change_log (uid, entity, entity_id, op)
+                VALUES (NEW.uid, 'food', NEW.fid, CASE WHEN OLD.is_active AND NOT NEW.is_active THEN 'delete' ELSE 'update' END);
+        END;
+        -- 이미 삭제 처리된 행의 정리(보관 이동 등)는 기록하지 않음
+        CREATE TRIGGER IF NOT EXISTS trg_foods_change_delete AFTER DELETE ON foods WHEN OLD.is_active BEGIN
+            INSERT INTO change_log (uid, entity, entity_id, op) VALUES (OLD.uid, 'food', OLD.fid, 'delete');
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_food_chat_change_insert AFTER INSERT ON food_chat BEGIN
+            INSERT INTO change_log (uid, entity, entity_id, op) VALUES (NEW.uid, 'food_chat', NEW.fcid, 'insert');
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_food_chat_change_status AFTER UPDATE OF status ON food_chat WHEN OLD.status IS NOT NEW.status BEGIN
+            INSERT INTO change_log (uid, entity, entity_id, op) VALUES (NEW.uid, 'food_chat', NEW.fcid, 'update');
+        END;
+    '''),
+    (9, "식품 전문 검색(FTS5 trigram) 인덱스 추가", '''
+        -- foods를 외부 콘텐츠로 사용하는 검색 인덱스. uid도 색인해 유저 범위로 먼저 좁힘
+        -- foods는 rowid 테이블이므로 VACUUM 후에는 db.food.rebuild_search_index() 실행 필요
+        CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+            uid, name, type, ingredients, description,
+            content='foods', content_rowid='rowid', tokenize='trigram'
+        );
+        INSERT INTO foods_fts (foods_fts) VALUES ('rebuild');
+
+        CREATE TRIGGER IF NOT EXISTS trg_foods_fts_insert AFTER INSERT ON foods BEGIN
+            INSERT INTO foods_fts (rowid, uid, name, type, ingredients, description)
+                VALUES (NEW.rowid, NEW.uid, NEW.name, NEW.type, NEW.ingredients, NEW.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_foods_fts_delete AFTER DELETE ON foods BEGIN
+            INSERT INTO foods_fts (foods_fts, rowid, uid, name, type, ingredients, description)
+                VALUES ('delete', OLD.rowid, OLD.uid, OLD.name, OLD.type, OLD.ingredients, OLD.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_foods_fts_update AFTER UPDATE OF uid, name, type, ingredients, description ON foods BEGIN
+            INSERT INTO foods_fts (foods_fts, rowid, uid, name, type, ingredients, description)
+                VALUES ('delete', OLD.rowid, OLD.uid, OLD.name, OLD.type, OLD.ingredients, OLD.description);
+            INSERT INTO foods_fts (rowid, uid, name, type, ingredients, description)
+                VALUES (NEW.rowid, NEW.uid, NEW.name, NEW.type, NEW.ingredients, NEW.description);
+        END;
+    '''),
+    (10, "같은 바코드 식품 중복 등록 방지(부분 유니크 인덱스)", '''
+        -- 기존 중복 행(같은 유저, 바코드, 유통기한 날짜)은 가장 먼저 등록된 행으로 수량을 합치고 나머지는 삭제 처리
+        UPDATE foods SET count = (
+            SELECT SUM(d.count) FROM foods d
+            WHERE d.uid = foods.uid AND d.barcode = foods.barcode AND date(d.expiration_date) = date(foods.expiration_date) AND d.is_active = 1
+        )
+        WHERE rowid IN (
+            SELECT MIN(rowid) FROM foods WHERE is_active = 1
+            GROUP BY uid, barcode, date(expiration_date) HAVING COUNT(*) > 1
+        );
+        UPDATE foods SET is_active = 0, updated_at = datetime('now', '+9 hours')
+        WHERE is_active = 1 AND rowid NOT IN (
+            SELECT MIN(rowid) FROM foods WHERE is_active = 1 GROUP BY uid, barcode, date(expiration_date)
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_foods_active_barcode_day ON foods (uid, barcode, date(expiration_date)) WHERE is_active = 1;
+    '''),
+    (11, "유저별 식품 요약(food_summary) 테이블과 트리거 추가", '''
+        -- 유저별 식품 요약. foods 변경 시 트리거로 증감하고, 유통기한 구간(만료/3일/7일 이내)은 주기적으로 다시 계산
+        CREATE TABLE IF NOT EXISTS food_summary (
+            uid TEXT PRIMARY KEY,
+            total_items INTEGER NOT NULL DEFAULT 0,
+            total_count INTEGER NOT NULL DEFAULT 0,
+            expired_items INTEGER NOT NULL DEFAULT 0,
+            expiring_3d_items INTEGER NOT NULL DEFAULT 0,
+            expiring_7d_items INTEGER NOT NULL DEFAULT 0,
+            buckets_updated_at TIMESTAMP DEFAULT NULL,
+            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours'))
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS food_type_summary (
+            uid TEXT NOT NULL,
+            type TEXT NOT NULL,
+            items INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (uid, type)
+        ) WITHOUT ROWID;
+
+        INSERT OR REPLACE INTO food_summary (uid, total_items, total_count, expired_items, expiring_3d_items, expiring_7d_items, buckets_updated_at)
+            SELECT uid, COUNT(*), SUM(count),
+                   SUM(expiration_date < datetime('now', 'localtime')),
+                   SUM(expiration_date >= datetime('now', 'localtime') AND expiration_date < datetime('now', 'localtime', '+3 days')),
+                   SUM(expiration_date >= datetime('now', 'localtime') AND expiration_date < datetime('now', 'localtime', '+7 days')),
+                   datetime('now', 'localtime')
+            FROM foods WHERE is_active = 1 GROUP BY uid;
+        INSERT OR REPLACE INTO food_type_summary (uid, type, items, count)
+            SELECT uid, type, COUNT(*), SUM(count) FROM foods WHERE is_active = 1 GROUP BY uid, type;
+
+        CREATE TRIGGER IF NOT EXISTS trg_foods_summary_insert AFTER INSERT ON foods WHEN NEW.is_active BEGIN
+            INSERT INTO food_summary (uid, total_items, total_count, expired_items, expiring_3d_items, expiring_7d_items)
+                SELECT NEW.uid, 1, NEW.count, (NEW.expiration_date < datetime('now', 'localtime')), (NEW.expiration_date >= datetime('now', 'localtime') AND NEW.expiration_date < datetime('now', 'localtime', '+3 days')), (NEW.expiration_date >= datetime('now', 'localtime') AND NEW.expiration_date < datetime('now', 'localtime', '+7 days')) WHERE 1
+                ON CONFLICT(uid) DO UPDATE SET
+                    total_items = total_items + 1,
+                    total_count = total_count + excluded.total_count,
+                    expired_items = expired_items + excluded.expired_items,
+                    expiring_3d_items = expiring_3d_items + excluded.expiring_3d_items,
+                    expiring_7d_items = expiring_7d_items + excluded.expiring_7d_items,
+                    updated_at = datetime('now', '+9 hours');
+            INSERT INTO food_type_summary (uid, type, items, count)
+                SELECT NEW.uid, NEW.type, 1, NEW.count WHERE 1
+                ON CONFLICT(uid, type) DO UPDATE SET items = items + 1, count = count + excluded.count;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_foods_summary_update AFTER UPDATE OF uid, is_active, type, count, expiration_date ON foods BEGIN
+            UPDATE food_summary SET
+                    total_items = total_items - 1,
+                    total_count = total_count - OLD.count,
+                    expired_items = expired_items - (OLD.expiration_date < datetime('now', 'localtime')),
+                    expiring_3d_items = expiring_3d_items - (OLD.expiration_date >= datetime('now', 'localtime') AND OLD.expiration_date < datetime('now', 'localtime', '+3 days')),
+                    expiring_7d_items = expiring_7d_items - (OLD.expiration_date >= datetime('now', 'localtime') AND OLD.expiration_date < datetime('now', 'localtime', '+7 days')),
+                    updated_at = datetime('now', '+9 hours')
+                WHERE uid = OLD.uid AND OLD.is_active;
+            UPDATE food_type_summary SET items = items - 1, count = count - OLD.count WHERE uid = OLD.uid AND type = OLD.type AND OLD.is_active;
+            DELETE FROM food_type_summary WHERE uid = OLD.uid AND type = OLD.type AND items <= 0;
+            INSERT INTO food_summary (uid, total_items, total_count, expired_items, expiring_3d_items, expiring_7d_items)
+                SELECT NEW.uid, 1, NEW.count, (NEW.expiration_date < datetime('now', 'localtime')), (NEW.expiration_date >= datetime('now', 'localtime') AND NEW.expiration_date < datetime('now', 'localtime', '+3 days')), (NEW.expiration_date >= datetime('now', 'localtime') AND NEW.expiration_date < datetime('now', 'localtime', '+7 days')) WHERE NEW.is_active
+                ON CONFLICT(uid) DO UPDATE SET
+                    total_items = total_items + 1,
+                    total_count = total_count + excluded.total_count,
+                    expired_items = expired_items + excluded.expired_items,
+                    expiring_3d_items = expiring_3d_items + excluded.expiring_3d_items,
+                    expiring_7d_items = expiring_7d_items + excluded.expiring_7d_items,
+                    updated_at = datetime('now', '+9 hours');
+            INSERT INTO food_type_summary (uid, type, items, count)
+                SELECT NEW.uid, NEW.type, 1, NEW.count WHERE NEW.is_active
+                ON CONFLICT(uid, type) DO UPDATE SET items = items + 1, count = count + excluded.count;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_foods_summary_delete AFTER DELETE ON foods WHEN OLD.is_active BEGIN
+            UPDATE food_summary SET
+                    total_items = total_items - 1,
+                    total_count = total_count - OLD.count,
+                    expired_items = expired_items - (OLD.expiration_date < datetime('now', 'localtime')),
+                    expiring_3d_items = expiring_3d_items - (OLD.expiration_date >= datetime('now', 'localtime') AND OLD.expiration_date < datetime('now', 'localtime', '+3 days')),
+                    expiring_7d_items = expiring_7d_items - (OLD.expiration_date >= datetime('now', 'localtime') AND OLD.expiration_date < datetime('now', 'localtime', '+7 days')),
+                    updated_at = datetime('now', '+9 hours')
+                WHERE uid = OLD.uid AND 1;
+            UPDATE food_type_summary SET items = items - 1, count = count - OLD.count WHERE uid = OLD.uid AND type = OLD.type AND 1;
+            DELETE FROM food_type_summary WHERE uid = OLD.uid AND type = OLD.type AND items <= 0;
+        END;
+    '''),
+    (12, "주기 작업 진행 위치(job_checkpoint) 테이블 추가", '''
+        CREATE TABLE IF NOT EXISTS job_checkpoint (
+            name TEXT PRIMARY KEY,
+            run_key TEXT NOT NULL,
+            cursor TEXT NOT NULL DEFAULT '',
+            is_done BOOLEAN NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours'))
+        );
+    '''),
+    (13, "삭제된 식품 보관(foods_archive) 테이블 추가", '''
+        CREATE TABLE IF NOT EXISTS foods_archive (
+            fid TEXT PRIMARY KEY,
+            uid TEXT NOT NULL,
+            is_active BOOLEAN NOT NULL DEFAULT 0,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            ingredients TEXT DEFAULT '정보없음',
+            description TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            volume TEXT DEFAULT NULL,
+            image_url TEXT DEFAULT NULL,
+            barcode TEXT NOT NULL,
+            expiration_date_desc TEXT,
+            expiration_date DATE NOT NULL,
+            updated_at TIMESTAMP,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT (datetime('now', '+9 hours'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_foods_archive_uid ON foods_archive (uid);
+        -- 보관 대상(삭제된 식품)만 삭제 시각 순으로 찾기 위한 부분 인덱스
+        CREATE INDEX IF NOT EXISTS idx_foods_inactive_updated ON foods (updated_at) WHERE is_active = 0;
+    '''),
+    (14, "대화 생성 작업 큐(food_chat_jobs) 테이블 추가", '''
+        -- 여러 프로세스가 함께 사용하는 대화 생성 작업 큐. 시각 값은 모두 unix time(초)
+        CREATE TABLE IF NOT EXISTS food_chat_jobs (
+            fcid TEXT PRIMARY KEY,
+            uid TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            enqueued_at REAL NOT NULL,
+            available_at REAL NOT NULL,
+            lease_owner TEXT DEFAULT NULL,
+            lease_expires_at REAL DEFAULT NULL,
+            last_error TEXT DEFAULT NULL,
+            updated_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            FOREIGN KEY (fcid) REFERENCES food_chat(fcid)
+        );
+        CREATE INDEX IF NOT EXISTS idx_food_chat_jobs_available ON food_chat_jobs (status, available_at);
+        CREATE INDEX IF NOT EXISTS idx_food_chat_jobs_lease ON food_chat_jobs (status, lease_expires_at);
+    '''),
+    (15, "레시피 추천 응답 캐시(recipe_cache) 테이블 추가", '''
+        CREATE TABLE IF NOT EXISTS recipe_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            expires_at TIMESTAMP NOT NULL,
+            last_used_at TIMESTAMP DEFAULT (datetime('now', '+9 hours')),
+            created_at TIMESTAMP DEFAULT (datetime('now', '+9 hours'))
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_recipe_cache_last_used ON recipe_cache (last_used_at);
+        CREATE INDEX IF NOT EXISTS idx_recipe_cache_expires ON recipe_cache (expires_at);
+        -- 요청별 캐시 사용 여부(0이면 캐시를 조회하지 않고 새로 생성)
+        ALTER TABLE food_chat_jobs ADD COLUMN use_cache BOOLEAN NOT NULL DEFAULT 1;
+    '''),
+    (16, "세션 버전 트리거를 세션 상태 변경에만 반응하도록 수정", '''
+        -- last_accessed 일괄 반영(5초 주기)마다 버전이 올라 /session/list ETag가 항상 바뀌던 문제 수정
+        -- 마지막 접근 시각은 ETag에 반영하지 않음(304 응답의 last_accessed는 이전 값일 수 있음)
+        DROP TRIGGER IF EXISTS trg_user_sessions_version_update;
+        CREATE TRIGGER IF NOT EXISTS trg_user_sessions_version_update
+            AFTER UPDATE OF uid, is_active, expires_at, user_agent, ip_address ON user_sessions BEGIN
+            INSERT INTO user_data_version (uid, resource, version) VALUES (NEW.uid, 'session', 1)
+                ON CONFLICT(uid, resource) DO UPDATE SET version = version + 1;
+        END;
+    '''),
+    (17, "식품 요약의 유통기한 구간을 유저별 기준 날짜로 계산하도록 수정", '''
+        -- 구간을 트리거 실행 시각 기준으로 나누면 등록 때와 삭제 때의 구간이 달라져 값이 어긋나고 음수가 될 수 있음
+        -- 유저별 기준 날짜(buckets_date)를 두고 증감 모두 그 날짜 기준으로 계산. 날짜가 바뀌면 refresh_summary_buckets가 다시 계산하고 기준 날짜를 옮김
+        -- 기본값은 과거 날짜라 아래 UPDATE 전에 남은 행도 다음 재계산 대상이 됨
+        -- INSERT ... SELECT 뒤의 WHERE는 ON CONFLICT 절을 조인 조건과 구분하기 위해 필요
+        ALTER TABLE food_summary ADD COLUMN buckets_date TEXT NOT NULL DEFAULT '1970-01-01';
+        UPDATE food_summary SET
+            expired_items = (SELECT COUNT(*) FROM foods WHERE foods.uid = food_summary.uid AND is_active = 1 AND expiration_date < date('now', 'localtime')),
+            expiring_3d_items = (SELECT COUNT(*) FROM foods WHERE foods.uid = food_summary.uid AND is_active = 1 AND expiration_date >= date('now', 'localtime') AND expiration_date < date('now', 'localtime', '+3 days')),
+            expiring_7d_items = (SELECT COUNT(*) FROM foods WHERE foods.uid = food_summary.uid AND is_active = 1 AND expiration_date >= date('now', 'localtime') AND expiration_date < date('now', 'localtime', '+7 days')),
+            buckets_date = date('now', 'localtime'),
+            buckets_updated_at = datetime('now', 'localtime');
+        CREATE INDEX IF NOT EXISTS idx_food_summary_buckets_date ON food_summary (buckets_date);
+
+        DROP TRIGGER IF EXISTS trg_foods_summary_insert;
+        DROP TRIGGER IF EXISTS trg_foods_summary_update;
+        DROP TRIGGER IF EXISTS trg_foods_summary_delete;
+        CREATE TRIGGER IF NOT EXISTS trg_foods_summary_insert AFTER INSERT ON foods WHEN NEW.is_active BEGIN
+            INSERT INTO food_summary (uid, total_items, total_count, expired_items, expiring_3d_items, expiring_7d_items, buckets_date, buckets_updated_at)
+                SELECT NEW.uid, 1, NEW.count, (NEW.expiration_date < ref), (NEW.expiration_date >= ref AND NEW.expiration_date < date(ref, '+3 days')), (NEW.expiration_date >= ref AND NEW.expiration_date < date(ref, '+7 days')), ref, datetime('now', 'localtime')
+                FROM (SELECT COALESCE((SELECT buckets_date FROM food_summary WHERE uid = NEW.uid), date('now', 'localtime')) AS ref) WHERE 1
+                ON CONFLICT(uid) DO UPDATE SET
+                    total_items = total_items + 1,
+                    total_count = total_count + excluded.total_count,
+                    expired_items = expired_items + excluded.expired_items,
+                    expiring_3d_items = expiring_3d_items + excluded.expiring_3d_items,
+                    expiring_7d_items = expiring_7d_items + excluded.expiring_7d_items,
+                    updated_at = datetime('now', '+9 hours');
+            INSERT INTO food_type_summary (uid, type, items, count)
+                SELECT NEW.uid, NEW.type, 1, NEW.count WHERE 1
+                ON CONFLICT(uid, type) DO UPDATE SET items = items + 1, count = count + excluded.count;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_foods_summary_update AFTER UPDATE OF uid, is_active, type, count, expiration_date ON foods BEGIN
+            UPDATE food_summary SET
+                    total_items = total_items - 1,
+                    total_count = total_count - OLD.count,
+                    expired_items = expired_items - (OLD.expiration_date < buckets_date),
+                    expiring_3d_items = expiring_3d_items - (OLD.expiration_date >= buckets_date AND OLD.expiration_date < date(buckets_date, '+3 days')),
+                    expiring_7d_items = expiring_7d_items - (OLD.expiration_date >= buckets_date AND OLD.expiration_date < date(buckets_date, '+7 days')),
+                    updated_at = datetime('now', '+9 hours')
+                WHERE uid = OLD.uid AND OLD.is_active;
+            UPDATE food_type_summary SET items = items - 1, count = count - OLD.count WHERE uid = OLD.uid AND type = OLD.type AND OLD.is_active;
+            DELETE FROM food_type_summary WHERE uid = OLD.uid AND type = OLD.type AND items <= 0;
+            INSERT INTO food_summary (uid, total_items, total_count, expired_items, expiring_3d_items, expiring_7d_items, buckets_date, buckets_updated_at)
+                SELECT NEW.uid, 1, NEW.count, (NEW.expiration_date < ref), (NEW.expiration_date >= ref AND NEW.expiration_date < date(ref, '+3 days')), (NEW.expiration_date >= ref AND NEW.expiration_date < date(ref, '+7 days')), ref, datetime('now', 'localtime')
+                FROM (SELECT COALESCE((SELECT buckets_date FROM food_summary WHERE uid = NEW.uid), date('now', 'localtime')) AS ref) WHERE NEW.is_active
+                ON CONFLICT(uid) DO UPDATE SET
+                    total_items = total_items + 1,
+                    total_count = total_count + excluded.total_count,
+                    expired_items = expired_items + excluded.expired_items,
+                    expiring_3d_items = expiring_3d_items + excluded.expiring_3d_items,
+                    expiring_7d_items = expiring_7d_items + excluded.expiring_7d_items,
+                    updated_at = datetime('now', '+9 hours');
+            INSERT INTO food_type_summary (uid, type, items, count)
+                SELECT NEW.uid, NEW.type, 1, NEW.count WHERE NEW.is_active
+                ON CONFLICT(uid, type) DO UPDATE SET items = items + 1, count = count + excluded.count;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_foods_summary_delete AFTER DELETE ON foods WHEN OLD.is_active BEGIN
+            UPDATE food_summary SET
+                    total_items = total_items - 1,
+                    total_count = total_count - OLD.count,
+                    expired_items = expired_items - (OLD.expiration_date < buckets_date),
+                    expiring_3d_items = expiring_3d_items - (OLD.expiration_date >= buckets_date AND OLD.expiration_date < date(buckets_date, '+3 days')),
+                    expiring_7d_items = expiring_7d_items - (OLD.expiration_date >= buckets_date AND OLD.expiration_date < date(buckets_date, '+7 days')),
+                    updated_at = datetime('now', '+9 hours')
+                WHERE uid = OLD.uid;
+            UPDATE food_type_summary SET items = items - 1, count = count - OLD.count WHERE uid = OLD.uid AND type = OLD.type;
+            DELETE FROM food_type_summary WHERE uid = OLD.uid AND type = OLD.type AND items <= 0;
+        END;
+    '''),
+]
+
+def get_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _split_statements(script: str) -> list:
+    # 트리거(BEGIN ... END)처럼 세미콜론이 포함된 문장도 sqlite3.complete_statement로 구분
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip():
+                statements.append(buffer.strip())
+            buffer = ''
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+def _apply(conn, version: int, step):
+    # 여러 프로세스가 동시에 시작해도 한 번만 적용되도록 쓰기 잠금 후 버전을 다시 확인
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if get_version(conn) >= version:
+            conn.rollback()
+            return False
+        if callable(step):
+            step(conn)
+        else:
+            for statement in _split_statements(step):
+                conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        return True
+    except BaseException:
+        conn.rollback()
+        raise
+
+def migrate() -> int:
+    conn = db.get_db_connection()
+    if conn.in_transaction:
+        conn.commit()
+
+    for version, description, step in MIGRATIONS:
+        if version <= get_version(conn):
+            continue
+        try:
+            applied = _apply(conn, version, step)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"DB 마이그레이션 {version}({description}) 적용에 실패했습니다: {e}") from e
+        if applied:
+            print(f"DB migration applied: {version} {description}")
+
+    return get_version(conn)
@@ -0,0 +1,112 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+import db
+import db.catalog
+import src.utils as utils
+import src.product_lookup
+from src.cache import TTLCache
+
+# 바코드 -> 상품 정보. 카탈로그(product_catalog) -> 메모리(LRU) -> product_cache 테이블 -> 외부 API 순서로 조회
+PRODUCT_MEMORY_CACHE_SIZE = 5000
+PRODUCT_MEMORY_CACHE_TTL = 10 * 60
+PRODUCT_CACHE_TTL_DAYS = 30
+PRODUCT_NOT_FOUND_TTL_HOURS = 6   # 찾을 수 없는 바코드는 짧게 보관 후 다시 조회
+
+product_memory_cache = TTLCache(maxsize=PRODUCT_MEMORY_CACHE_SIZE, ttl=PRODUCT_MEMORY_CACHE_TTL)
+_NOT_FOUND = {}
+
+PRODUCT_FIELDS = ('name', 'type', 'pog_daycnt', 'volume', 'image_url')
+
+# 여러 바코드 동시 조회용(외부 API 조회 스레드와 분리)
+PRODUCT_BATCH_WORKERS = 8
+batch_executor = ThreadPoolExecutor(max_workers=PRODUCT_BATCH_WORKERS, thread_name_prefix='product-batch')
+
+def fetch_product(barcode: str) -> tuple[dict | None, bool]:
+    # 외부 API 조회. (상품 정보, 모든 출처가 응답했는지 여부) 반환
+    product, is_complete = src.product_lookup.lookup(barcode)
+    if not product.get('name'):
+        return None, is_complete
+    return {field: product.get(field) for field in PRODUCT_FIELDS}, is_complete
+
+def get_cached_product(barcode: str):
+    # 캐시에 없으면 None, 찾을 수 없는 바코드로 캐시되어 있으면 _NOT_FOUND
+    product = product_memory_cache.get(barcode)
+    if product is not None:
+        return product
+
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM product_cache WHERE barcode = ? AND expires_at > ?", (barcode, utils.get_current_datetime_str()))
+    row = cursor.fetchone()
+    db.close_db_connection(conn)
+    if not row:
+        return None
+
+    product = {field: row[field] for field in PRODUCT_FIELDS} if row['is_found'] else _NOT_FOUND
+    product_memory_cache.set(barcode, product)
+    return product
+
+def set_cached_product(barcode: str, product: dict | None):
+    if product:
+        expires_at = utils.get_future_timestamp(days=PRODUCT_CACHE_TTL_DAYS)
+    else:
+        expires_at = utils.get_future_timestamp(hours=PRODUCT_NOT_FOUND_TTL_HOURS)
+    product = product or {}
+
+    try:
+        with db.connection() as conn:
+            conn.execute('''INSERT INTO product_cache (barcode, is_found, name, type, pog_daycnt, volume, image_url, expires_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(barcode) DO UPDATE SET
+                                is_found = excluded.is_found, name = excluded.name, type = excluded.type,
+                                pog_daycnt = excluded.pog_daycnt, volume = excluded.volume, image_url = excluded.image_url,
+                                expires_at = excluded.expires_at, updated_at = datetime('now', '+9 hours')''',
+                         (barcode, bool(product), *[product.get(field) for field in PRODUCT_FIELDS], expires_at))
+    except sqlite3.Error as e:
+        print(f"Failed to cache product {barcode}: {e}")
+        return
+    product_memory_cache.set(barcode, product or _NOT_FOUND)
+
+def _with_catalog(product: dict | None, catalog_product: dict | None) -> dict | None:
+    # 외부 API에는 원재료 정보가 없으므로 카탈로그 값으로 보충
+    if not product:
+        return None
+    return dict(product, ingredients=(catalog_product or {}).get('ingredients'))
+
+def get_local_product(barcode: str):
+    # 카탈로그와 캐시만 조회. 네트워크 조회가 필요하면 None, 찾을 수 없는 바코드면 _NOT_FOUND
+    catalog_product = db.catalog.get_product(barcode)
+    if catalog_product and catalog_product['name']:
+        return catalog_product
+
+    product = get_cached_product(barcode)
+    if product is None:
+        return None
+    return _with_catalog(product, catalog_product) or _NOT_FOUND
+
+def get_product(barcode: str) -> dict | None:
+    # 카탈로그 -> 캐시 -> 외부 API 순서로 조회
+    product = get_local_product(barcode)
+    if product is not None:
+        return product or None
+
+    product, is_complete = fetch_product(barcode)
+    # 일부 출처가 응답하지 않은 결과는 캐시하지 않음
+    if is_complete:
+        set_cached_product(barcode, product)
+    return _with_catalog(product, db.catalog.get_product(barcode))
+
+def get_products(barcodes: list) -> dict:
+    # 바코드 목록 동시 조회. 카탈로그/캐시에 있는 바코드는 바로 반환하고 나머지만 외부 API 조회
+    products = {}
+    missing = []
+    for barcode in dict.fromkeys(barcodes):
+        product = get_local_product(barcode)
+        if product is None:
+            missing.append(barcode)
+        else:
+            products[barcode] = product or None
+
+    for barcode, product in zip(missing, batch_executor.map(get_product, missing)):
+        products[barcode] = product
+    return products
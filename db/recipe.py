@@ -0,0 +1,127 @@
+import json
+import atexit
+import sqlite3
+import hashlib
+import threading
+import db
+import src.utils as utils
+from datetime import datetime
+from src.cache import TTLCache
+from src.scheduler import PeriodicTask
+
+# 레시피 추천 응답 캐시. 프롬프트에 들어가는 식품 정보(이름/용량/유형)와 식사 시간대가 같으면 같은 응답을 재사용
+# 메모리(LRU) -> recipe_cache 테이블 순서로 조회
+RECIPE_CACHE_VERSION = 1           # 프롬프트나 모델을 바꾸면 올려서 기존 캐시를 무효화
+RECIPE_MEMORY_CACHE_SIZE = 1000
+RECIPE_MEMORY_CACHE_TTL = 10 * 60
+RECIPE_CACHE_TTL_HOURS = 24
+RECIPE_CACHE_MAX_ROWS = 10000
+RECIPE_CACHE_PRUNE_INTERVAL = 600
+RECIPE_HIT_FLUSH_INTERVAL = 60
+
+recipe_memory_cache = TTLCache(maxsize=RECIPE_MEMORY_CACHE_SIZE, ttl=RECIPE_MEMORY_CACHE_TTL)
+
+def meal_bucket(hour: int) -> str:
+    # generate_chat 프롬프트의 시간대 구분과 동일
+    if 6 <= hour <= 10:
+        return 'breakfast'
+    if 11 <= hour <= 14:
+        return 'lunch'
+    if 15 <= hour <= 17:
+        return 'snack'
+    if 18 <= hour <= 21:
+        return 'dinner'
+    return 'late_night'
+
+def get_key(food_info_list: list, now: datetime) -> str:
+    # 식품 순서와 앞뒤 공백에 관계없이 같은 키가 되도록 정규화
+    descriptors = sorted(
+        [str(food_info['name'] or '').strip(), str(food_info['volume'] or '').strip(), str(food_info['type'] or '').strip()]
+        for food_info in food_info_list
+    )
+    payload = json.dumps({'version': RECIPE_CACHE_VERSION, 'meal': meal_bucket(now.hour), 'foods': descriptors}, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+# 캐시 사용 횟수/시각 기록. 조회마다 쓰지 않고(쓰기 잠금 방지) 메모리에 모아두었다가 주기적으로 한 번에 반영
+class RecipeHitTracker:
+    def __init__(self, interval: float):
+        self._pending = {}   # key -> 사용 횟수
+        self._lock = threading.Lock()
+        self.flush_task = PeriodicTask('recipe-hit-flush', interval, self.flush)
+        atexit.register(self.flush)
+
+    def hit(self, key: str):
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            with db.connection() as conn:
+                conn.executemany("UPDATE recipe_cache SET hits = hits + ?, last_used_at = datetime('now', '+9 hours') WHERE key = ?",
+                                 [(hits, key) for key, hits in pending.items()])
+        except sqlite3.Error as e:
+            # 실패한 항목은 다음 주기에 다시 반영
+            with self._lock:
+                for key, hits in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + hits
+            print(f"Failed to flush recipe cache hits: {e}")
+            return 0
+        return len(pending)
+
+recipe_hit_tracker = RecipeHitTracker(RECIPE_HIT_FLUSH_INTERVAL)
+
+def get_cached_recipe(key: str) -> str | None:
+    response = recipe_memory_cache.get(key)
+    if response is not None:
+        recipe_hit_tracker.hit(key)
+        return response
+
+    conn = db.get_db_connection()
+    try:
+        row = conn.execute("SELECT response FROM recipe_cache WHERE key = ? AND expires_at > ?", (key, utils.get_current_datetime_str())).fetchone()
+    except sqlite3.Error as e:
+        print(f"Failed to read recipe cache: {e}")
+        return None
+    finally:
+        db.close_db_connection(conn)
+    if not row:
+        return None
+
+    recipe_hit_tracker.hit(key)
+    recipe_memory_cache.set(key, row['response'])
+    return row['response']
+
+def set_cached_recipe(key: str, response: str):
+    if not response:
+        return
+    expires_at = utils.get_future_timestamp(hours=RECIPE_CACHE_TTL_HOURS)
+
+    try:
+        with db.connection() as conn:
+            conn.execute('''INSERT INTO recipe_cache (key, response, expires_at) VALUES (?, ?, ?)
+                            ON CONFLICT(key) DO UPDATE SET
+                                response = excluded.response, expires_at = excluded.expires_at,
+                                last_used_at = datetime('now', '+9 hours')''', (key, response, expires_at))
+    except sqlite3.Error as e:
+        print(f"Failed to cache recipe: {e}")
+        return
+    recipe_memory_cache.set(key, response)
+
+def prune_recipe_cache(max_rows: int = RECIPE_CACHE_MAX_ROWS) -> dict:
+    # 만료된 항목을 지우고, 남은 항목이 max_rows를 넘으면 오래 사용되지 않은 순서로 삭제
+    # 아직 반영되지 않은 사용 기록을 먼저 반영해 최근 사용한 항목이 지워지지 않도록 함
+    recipe_hit_tracker.flush()
+    with db.connection() as conn:
+        expired = conn.execute("DELETE FROM recipe_cache WHERE expires_at <= ?", (utils.get_current_datetime_str(),)).rowcount
+        evicted = conn.execute("""
+            DELETE FROM recipe_cache WHERE key IN (
+                SELECT key FROM recipe_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )""", (max_rows,)).rowcount
+    return {'expired': expired, 'evicted': evicted}
+
+recipe_cache_pruner = PeriodicTask('recipe-cache-prune', RECIPE_CACHE_PRUNE_INTERVAL, prune_recipe_cache)
@@ -1,37 +1,175 @@
+import os
+import hmac
+import base64
+import hashlib
 import sqlite3
+import atexit
+import threading
+from dataclasses import dataclass
 import db
 import db.user
 import src.utils as utils
 import src.email
+from src.cache import TTLCache
+from src.scheduler import PeriodicTask
 
-def get_session_list(sid: str) -> utils.ResultDTO:
-    # 세션 ID가 유효한지 확인
-    session_info = get_info(sid)
+# sid -> 세션 정보 캐시. 세션 상태가 바뀌는 곳에서는 반드시 invalidate 호출
+SESSION_CACHE_SIZE = 10000
+SESSION_CACHE_TTL = 30
+session_cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+
+def invalidate_session(sid: str):
+    session_cache.delete(sid)
+
+def invalidate_user_sessions(uid: str):
+    session_cache.delete_where(lambda sid, session_info: session_info['uid'] == uid)
+
+# 서명된 세션 토큰 모드. 토큰에 sid, uid, 만료 시각, 세대 번호를 담아 DB 조회 없이 검증
+# 무효화는 메모리의 revoked_sessions(비활성 세션)와 user_generations(유저별 세대 번호)로 처리
+SESSION_TOKEN_MODE = os.environ.get('SESSION_TOKEN_MODE', 'false').lower() in ('1', 'true', 'yes')
+
+revoked_sessions = {}   # sid -> expires_at
+user_generations = {}   # uid -> session_generation
+_token_lock = threading.Lock()
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(os.environ['SECRET_KEY'].encode(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+def issue_session_token(sid: str, uid: str, expires_at: str, generation: int) -> str:
+    expires_ts = int(utils.str_to_datetime(expires_at).timestamp())
+    payload = f"{sid}.{uid}.{expires_ts}.{generation}"
+    return f"{payload}.{_sign(payload)}"
+
+def is_session_token(value) -> bool:
+    return isinstance(value, str) and value.count('.') == 4
+
+def parse_session_token(token: str) -> dict | None:
+    # 서명이 올바른 경우에만 토큰 내용을 반환
+    try:
+        payload, signature = token.rsplit('.', 1)
+        # 비ASCII 문자가 섞인 str은 compare_digest가 TypeError를 내므로 bytes로 비교
+        if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+            return None
+        sid, uid, expires_ts, generation = payload.split('.')
+        return {'sid': sid, 'uid': uid, 'expires_ts': int(expires_ts), 'generation': int(generation)}
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+def revoke_session(sid: str, expires_at: str):
+    with _token_lock:
+        revoked_sessions[sid] = expires_at
+
+def set_user_generation(uid: str, generation: int):
+    with _token_lock:
+        if generation > user_generations.get(uid, 0):
+            user_generations[uid] = generation
+
+def load_revocations():
+    # 아직 만료되지 않은 비활성 세션을 DB에서 다시 읽어 무효화 목록 갱신(다른 프로세스의 로그아웃 반영)
+    now = utils.get_current_datetime_str()
+    with db.connection() as conn:
+        rows = conn.execute("SELECT sid, expires_at FROM user_sessions WHERE is_active = 0 AND expires_at > ?", (now,)).fetchall()
+        generations = conn.execute("SELECT uid, session_generation FROM users WHERE session_generation > 0").fetchall()
+
+    with _token_lock:
+        for sid in [sid for sid, expires_at in revoked_sessions.items() if expires_at <= now]:
+            del revoked_sessions[sid]
+        for row in rows:
+            revoked_sessions[row['sid']] = row['expires_at']
+        for row in generations:
+            if row['session_generation'] > user_generations.get(row['uid'], 0):
+                user_generations[row['uid']] = row['session_generation']
+
+def _get_token_context(token: str) -> utils.ResultDTO:
+    token_info = parse_session_token(token)
+    if not token_info:
+        return utils.ResultDTO(code=401, message="유효하지 않은 세션 ID입니다.", result=False)
+    if utils.get_current_datetime().timestamp() > token_info['expires_ts']:
+        return utils.ResultDTO(code=401, message="세션이 만료되었습니다.", result=False)
+    if token_info['sid'] in revoked_sessions or token_info['generation'] < user_generations.get(token_info['uid'], 0):
+        return utils.ResultDTO(code=401, message="비활성화된 세션입니다.", result=False)
+
+    context = SessionContext(
+        sid=token_info['sid'],
+        uid=token_info['uid'],
+        is_active=True,
+        expires_at=utils.datetime_to_str(utils.datetime.fromtimestamp(token_info['expires_ts']))
+    )
+    return utils.ResultDTO(code=200, message="세션을 성공적으로 조회했습니다.", data={'session': context}, result=True)
+
+# 요청 단위로 한 번 검증한 세션 정보. db 함수에 sid 대신 전달하면 세션 재조회를 생략
+@dataclass(frozen=True)
+class SessionContext:
+    sid: str
+    uid: str
+    is_active: bool
+    expires_at: str
+
+def get_context(session: 'str | SessionContext') -> utils.ResultDTO:
+    # 이미 검증된 세션 정보라면 그대로 사용
+    if isinstance(session, SessionContext):
+        return utils.ResultDTO(code=200, message="세션을 성공적으로 조회했습니다.", data={'session': session}, result=True)
+    if SESSION_TOKEN_MODE and is_session_token(session):
+        session_info = _get_token_context(session)
+        if session_info.result:
+            access_tracker.touch(session_info.data['session'].sid)
+        return session_info
+
+    session_info = get_info(session)
     if not session_info.result:
-        return utils.ResultDTO(code=404, message="유효하지 않은 세션 ID입니다.", result=False)
-    # 세션이 비활성화된 경우 실패 처리
+        return session_info
     session_info = session_info.data['session_info']
     if not session_info['is_active']:
         return utils.ResultDTO(code=401, message="비활성화된 세션입니다.", result=False)
 
+    context = SessionContext(
+        sid=session_info['sid'],
+        uid=session_info['uid'],
+        is_active=bool(session_info['is_active']),
+        expires_at=session_info['expires_at']
+    )
+    access_tracker.touch(context.sid)
+    return utils.ResultDTO(code=200, message="세션을 성공적으로 조회했습니다.", data={'session': context}, result=True)
+
+def get_session_list(session: 'str | SessionContext') -> utils.ResultDTO:
+    # 세션 ID가 유효한지 확인
+    session_info = get_context(session)
+    if not session_info.result:
+        return session_info
+    session = session_info.data['session']
+
     conn = db.get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute("SELECT * FROM user_sessions WHERE uid = ? ORDER BY created_at DESC", (session_info['uid'],))
+    cursor.execute("SELECT * FROM user_sessions WHERE uid = ? ORDER BY created_at DESC", (session.uid,))
     rows = cursor.fetchall()
 
     db.close_db_connection(conn)
-    return utils.ResultDTO(code=200, message="세션 목록을 성공적으로 조회했습니다.", data={"sessions_info" : [dict(row) for row in rows]}, result=True)
 
-def deactivate_session(sid: str) -> utils.ResultDTO:
-    # 세션 ID가 유효한지 확인
-    session_info = get_info(sid)
-    if not session_info.result:
-        return utils.ResultDTO(code=404, message="유효하지 않은 세션 ID입니다.", result=False)
-    # 이미 세션이 비활성화된 경우 실패 처리
-    session_info = session_info.data['session_info']
-    if not session_info['is_active']:
-        return utils.ResultDTO(code=400, message="이미 비활성화(로그아웃)된 세션입니다.", result=False)
+    # 아직 DB에 기록되지 않은 최근 접근 시간 반영
+    sessions_info = [dict(row) for row in rows]
+    for session_info in sessions_info:
+        session_info['last_accessed'] = access_tracker.get(session_info['sid'], session_info['last_accessed'])
+
+    return utils.ResultDTO(code=200, message="세션 목록을 성공적으로 조회했습니다.", data={"sessions_info" : sessions_info}, result=True)
+
+def deactivate_session(session: 'str | SessionContext') -> utils.ResultDTO:
+    if isinstance(session, SessionContext):
+        sid = session.sid
+        expires_at = session.expires_at
+    else:
+        sid = session
+        # 세션 ID가 유효한지 확인
+        session_info = get_info(sid)
+        if not session_info.result:
+            return utils.ResultDTO(code=404, message="유효하지 않은 세션 ID입니다.", result=False)
+        # 이미 세션이 비활성화된 경우 실패 처리
+        session_info = session_info.data['session_info']
+        if not session_info['is_active']:
+            return utils.ResultDTO(code=400, message="이미 비활성화(로그아웃)된 세션입니다.", result=False)
+        sid = session_info['sid']
+        expires_at = session_info['expires_at']
 
     # 세션 비활성화
     conn = db.get_db_connection()
@@ -39,6 +177,8 @@ def deactivate_session(sid: str) -> utils.ResultDTO:
     try:
         cursor.execute("UPDATE user_sessions SET is_active = 0 WHERE sid = ?", (sid,))
         conn.commit()
+        invalidate_session(sid)
+        revoke_session(sid, expires_at)
         
         return utils.ResultDTO(code=200, message="로그아웃 되었습니다.", result=True)
     except sqlite3.Error as e:
@@ -64,23 +204,28 @@ def create_session(email: str, password: str, user_agent: str, ip_address: str)
     expires_at = utils.get_future_timestamp(days=31)  # 31일 뒤 세션 만료
 
     try:
-        # 세션 생성
+        # 세션 생성, 이전 세션 비활성화, 비활성화 링크 생성을 하나의 트랜잭션으로 처리
         cursor.execute("INSERT INTO user_sessions (sid, uid, user_agent, ip_address, expires_at) VALUES (?, ?, ?, ?, ?)",
                        (sid, uid.data['uid'], user_agent, ip_address, expires_at))
-        conn.commit()
         
-        # 최신 날짜 순으로 1개 세션만 유지. 나머지는 is_activate를 0으로 설정
-        cursor.execute("UPDATE user_sessions SET is_active = 0 WHERE uid = ? AND sid NOT IN (SELECT sid FROM user_sessions WHERE uid = ? ORDER BY created_at DESC LIMIT 1)", (uid.data['uid'], uid.data['uid']))
-        conn.commit()
+        # 새 세션 1개만 유지. 나머지 활성 세션은 is_active를 0으로 설정
+        cursor.execute("UPDATE user_sessions SET is_active = 0, update_at = datetime('now', '+9 hours') WHERE uid = ? AND is_active = 1 AND sid != ?", (uid.data['uid'], sid))
+        # 세대 번호를 올려 이전 토큰을 모두 무효화
+        cursor.execute("UPDATE users SET session_generation = session_generation + 1 WHERE uid = ? RETURNING session_generation", (uid.data['uid'],))
+        generation = cursor.fetchone()['session_generation']
         
         # 세션 비활성화 링크 이메일 첨부
         link_hash = utils.gen_hash(64)
         cursor.execute("INSERT INTO user_session_deactive_link (sid, link_hash) VALUES (?, ?)", (sid, link_hash))
         conn.commit()
+        invalidate_user_sessions(uid.data['uid'])
+        set_user_generation(uid.data['uid'], generation)
         
-        # 이메일 알림
+        # 이메일 알림(조회와 템플릿 렌더링은 이메일 워커에서 처리)
         src.email.service.send_session_created_email(email, sid, link_hash)
         
+        if SESSION_TOKEN_MODE:
+            return utils.ResultDTO(code=200, message="성공적으로 로그인하였습니다.", data={'sid': issue_session_token(sid, uid.data['uid'], expires_at, generation)}, result=True)
         return utils.ResultDTO(code=200, message="성공적으로 로그인하였습니다.", data={'sid': sid}, result=True)
     except sqlite3.IntegrityError:
         return utils.ResultDTO(code=409, message="세션이 이미 존재합니다.", result=False)
@@ -88,35 +233,51 @@ def create_session(email: str, password: str, user_agent: str, ip_address: str)
         db.close_db_connection(conn)
         
 def get_info(sid: str) -> utils.ResultDTO:
-    conn = db.get_db_connection()
-    cursor = conn.cursor()
+    # 토큰이 전달된 경우 서명 확인 후 토큰 안의 sid로 조회
+    if SESSION_TOKEN_MODE and is_session_token(sid):
+        token_info = parse_session_token(sid)
+        sid = token_info['sid'] if token_info else None
+    if not sid:
+        return utils.ResultDTO(code=401, message="유효하지 않은 세션 ID입니다.", result=False)
 
-    cursor.execute("SELECT * FROM user_sessions WHERE sid = ?", (sid,))
-    row = cursor.fetchone()
+    session_info = session_cache.get(sid)
+    if session_info is None:
+        conn = db.get_db_connection()
+        cursor = conn.cursor()
 
-    # 없는 세션 ID인 경우 실패 처리
-    if not row:
-        db.close_db_connection(conn)
-        return utils.ResultDTO(code=401, message="유효하지 않은 세션 ID입니다.", result=False)
+        cursor.execute("SELECT * FROM user_sessions WHERE sid = ?", (sid,))
+        row = cursor.fetchone()
 
-    # 현재 시간이 expires_at을 초과한 경우 실패 처리(is_active도 0으로 설정)
-    if utils.get_current_datetime() > utils.str_to_datetime(row['expires_at']):
-        cursor.execute("UPDATE user_sessions SET is_active = 0 WHERE sid = ?", (sid,))
+        # 없는 세션 ID인 경우 실패 처리
+        if not row:
+            db.close_db_connection(conn)
+            return utils.ResultDTO(code=401, message="유효하지 않은 세션 ID입니다.", result=False)
+
+        # 현재 시간이 expires_at을 초과한 경우 실패 처리(is_active는 session_sweeper가 정리)
+        if utils.get_current_datetime() > utils.str_to_datetime(row['expires_at']):
+            db.close_db_connection(conn)
+            return utils.ResultDTO(code=401, message="세션이 만료되었습니다.", result=False)
+
+        session_info = {
+            'sid': row['sid'],
+            'uid': row['uid'],
+            'user_agent': row['user_agent'],
+            'ip_address': row['ip_address'],
+            'is_active': row['is_active'],
+            'last_accessed': row['last_accessed'],
+            'expires_at': row['expires_at'],
+            'created_at': row['created_at']
+        }
+        session_cache.set(sid, session_info)
         db.close_db_connection(conn)
-        return utils.ResultDTO(code=401, message="세션이 만료되었습니다.", result=False)
 
-    session_info = {
-        'sid': row['sid'],
-        'uid': row['uid'],
-        'user_agent': row['user_agent'],
-        'ip_address': row['ip_address'],
-        'is_active': row['is_active'],
-        'last_accessed': row['last_accessed'],
-        'expires_at': row['expires_at'],
-        'created_at': row['created_at']
-    }
+    # 캐시에 남아있는 동안 만료된 경우
+    elif utils.get_current_datetime() > utils.str_to_datetime(session_info['expires_at']):
+        invalidate_session(sid)
+        return utils.ResultDTO(code=401, message="세션이 만료되었습니다.", result=False)
 
-    db.close_db_connection(conn)
+    session_info = dict(session_info)
+    session_info['last_accessed'] = access_tracker.get(sid, session_info['last_accessed'])
     return utils.ResultDTO(code=200, message="세션을 성공적으로 조회했습니다.", data={'session_info': session_info}, result=True)
 
 def get_session_deactive_info(link_hash: str) -> utils.ResultDTO:
@@ -157,4 +318,108 @@ def mark_deactive_link_as_used(link_hash: str) -> utils.ResultDTO:
     except sqlite3.Error as e:
         return utils.ResultDTO(code=500, message=f"링크 사용 처리에 실패했습니다: {e}", result=False)
     finally:
-        db.close_db_connection(conn)
\ No newline at end of file
+        db.close_db_connection(conn)
+
+# 세션 마지막 접근 시간 기록. 요청마다 쓰지 않고 메모리에 모아두었다가 주기적으로 한 번에 반영
+SESSION_ACCESS_FLUSH_INTERVAL = 5
+
+class SessionAccessTracker:
+    def __init__(self, interval: float):
+        self._pending = {}   # sid -> last_accessed
+        self._lock = threading.Lock()
+        self.flush_task = PeriodicTask('session-access-flush', interval, self.flush)
+        atexit.register(self.flush)
+
+    def touch(self, sid: str):
+        now = utils.get_current_datetime_str()
+        with self._lock:
+            self._pending[sid] = now
+
+    def get(self, sid: str, default=None):
+        with self._lock:
+            return self._pending.get(sid, default)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            with db.connection() as conn:
+                conn.executemany("UPDATE user_sessions SET last_accessed = ? WHERE sid = ?",
+                                 [(last_accessed, sid) for sid, last_accessed in pending.items()])
+        except sqlite3.Error as e:
+            # 실패한 항목은 다음 주기에 다시 시도(그 사이 새로 기록된 값이 우선)
+            with self._lock:
+                for sid, last_accessed in pending.items():
+                    self._pending.setdefault(sid, last_accessed)
+            print(f"Failed to flush session access times: {e}")
+            return 0
+        return len(pending)
+
+access_tracker = SessionAccessTracker(SESSION_ACCESS_FLUSH_INTERVAL)
+
+# 만료 세션 정리 작업
+SESSION_SWEEP_INTERVAL = 60
+SESSION_SWEEP_BATCH_SIZE = 500
+SESSION_RETENTION_DAYS = 90
+
+def expire_sessions(batch_size: int = SESSION_SWEEP_BATCH_SIZE) -> int:
+    # expires_at이 지난 활성 세션을 batch_size개씩 나누어 비활성화
+    now = utils.get_current_datetime_str()
+    total = 0
+    while True:
+        with db.connection() as conn:
+            cursor = conn.execute("""
+                UPDATE user_sessions SET is_active = 0, update_at = datetime('now', '+9 hours')
+                WHERE rowid IN (
+                    SELECT rowid FROM user_sessions WHERE is_active = 1 AND expires_at <= ? LIMIT ?
+                )""", (now, batch_size))
+            count = cursor.rowcount
+        total += count
+        if count < batch_size:
+            return total
+
+def purge_sessions(retention_days: int = SESSION_RETENTION_DAYS, batch_size: int = SESSION_SWEEP_BATCH_SIZE) -> dict:
+    # 보관 기간이 지난 비활성 세션과 사용된 비활성화 링크 삭제
+    cutoff = utils.datetime_to_str(utils.get_current_datetime() - utils.timedelta(days=retention_days))
+    purged = {'sessions': 0, 'deactive_links': 0}
+
+    while True:
+        with db.connection() as conn:
+            rows = conn.execute("SELECT sid FROM user_sessions WHERE is_active = 0 AND expires_at < ? LIMIT ?", (cutoff, batch_size)).fetchall()
+            sids = [(row['sid'],) for row in rows]
+            conn.executemany("DELETE FROM user_session_deactive_link WHERE sid = ?", sids)
+            conn.executemany("DELETE FROM user_sessions WHERE sid = ?", sids)
+        purged['sessions'] += len(sids)
+        if len(sids) < batch_size:
+            break
+
+    while True:
+        with db.connection() as conn:
+            cursor = conn.execute("""
+                DELETE FROM user_session_deactive_link
+                WHERE rowid IN (
+                    SELECT rowid FROM user_session_deactive_link WHERE is_used = 1 AND update_at < ? LIMIT ?
+                )""", (cutoff, batch_size))
+            count = cursor.rowcount
+        purged['deactive_links'] += count
+        if count < batch_size:
+            break
+
+    return purged
+
+def sweep_sessions() -> dict:
+    result = {'expired': expire_sessions()}
+    result.update(purge_sessions())
+    if SESSION_TOKEN_MODE:
+        load_revocations()
+    return result
+
+if SESSION_TOKEN_MODE:
+    if not os.environ.get('SECRET_KEY'):
+        raise RuntimeError("SESSION_TOKEN_MODE를 사용하려면 SECRET_KEY가 필요합니다.")
+    load_revocations()
+
+session_sweeper = PeriodicTask('session-sweeper', SESSION_SWEEP_INTERVAL, sweep_sessions, run_on_start=True)
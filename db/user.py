@@ -4,15 +4,13 @@ import db.session
 import src.utils as utils
 import src.email
 
-def set_profile_url(session_id: str, profile_url: str) -> utils.ResultDTO:
+def set_profile_url(session: 'str | db.session.SessionContext', profile_url: str) -> utils.ResultDTO:
     # Validate session ID
-    session_info = db.session.get_info(session_id)
-    if not session_info:
-        return utils.ResultDTO(code=405, message="Invalid session ID", result=False)
-    if not session_info['is_active']:
-        return utils.ResultDTO(code=401, message="Inactive session ID", result=False)
+    session_info = db.session.get_context(session)
+    if not session_info.result:
+        return session_info
 
-    uid = session_info['uid']
+    uid = session_info.data['session'].uid
     conn = db.get_db_connection()
     cursor = conn.cursor()
 
@@ -175,6 +173,8 @@ def delete_user(email: str, password: str) -> utils.ResultDTO:
         cursor.execute("DELETE FROM users WHERE uid = ?", (uid,))
         
         conn.commit()
+        db.session.invalidate_user_sessions(uid)
+        db.session.set_user_generation(uid, db.session.user_generations.get(uid, 0) + 1)
         
         src.email.service.send_deleted_account_email(email, user_info)
         
@@ -0,0 +1,13 @@
+import db
+
+# 유저별/리소스별 데이터 버전. foods, food_chat, user_sessions 변경 시 트리거로 1씩 증가(migration 7)
+RESOURCES = ('food', 'food_chat', 'session')
+
+def get_versions(uid: str, resources: tuple) -> dict:
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT resource, version FROM user_data_version WHERE uid = ? AND resource IN ({', '.join('?' * len(resources))})", (uid, *resources))
+    versions = {resource: 0 for resource in resources}
+    versions.update({row['resource']: row['version'] for row in cursor.fetchall()})
+    db.close_db_connection(conn)
+    return versions
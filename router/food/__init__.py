@@ -1,38 +1,87 @@
-from flask import Blueprint, Response, request, stream_with_context
+from flask import Blueprint, request
 from router.food.chat import chat_bp
 import db.user
 import db.session
 import db.food
 import db.food_chat
 import src.utils as utils
+from src.auth import session_required, current_session
+from src.etag import etag_by_version
 
 food_bp = Blueprint('food', __name__, url_prefix='/food')
 food_bp.register_blueprint(chat_bp)
 
 @food_bp.route('', methods=['GET'])
+@session_required
 def get_food_info():
-    sid = request.args.get('sid')
     fid = request.args.get('fid')
     
-    return db.food.get_info(sid, fid).to_response()
+    return db.food.get_info(current_session(), fid).to_response()
 
 @food_bp.route('', methods=['POST'])
+@session_required
 def regi_food():
-    session_id = request.form.get('sid')
     barcode = request.form.get('barcode')
     count = request.form.get('count', 1, type=int)
+    # 유통기한 날짜가 다르면 별도 행으로 등록할지 여부(기본값: 같은 바코드는 하나로 합침)
+    split_by_expiration = request.form.get('split_by_expiration', '0') in ('1', 'true')
 
-    return db.food.regi_food_with_barcode(session_id, barcode, count).to_response()
+    return db.food.regi_food_with_barcode(current_session(), barcode, count, split_by_expiration).to_response()
+
+@food_bp.route('/bulk', methods=['POST'])
+@session_required
+def regi_food_bulk():
+    barcodes = request.form.getlist('barcode')
+    counts = request.form.getlist('count', type=int)
+    # 수량이 생략된 경우 모두 1개로 등록
+    if not counts:
+        counts = [1] * len(barcodes)
+    if len(counts) != len(barcodes):
+        return utils.ResultDTO(code=400, message="바코드와 수량의 개수가 일치하지 않습니다.", result=False).to_response()
+
+    split_by_expiration = request.form.get('split_by_expiration', '0') in ('1', 'true')
+
+    return db.food.regi_foods_with_barcodes(current_session(), list(zip(barcodes, counts)), split_by_expiration).to_response()
 
 @food_bp.route('', methods=['DELETE'])
+@session_required
 def delete_food():
-    sid = request.form.get('sid')
     fid = request.form.get('fid')
 
-    return db.food.delete_food(sid, fid).to_response()
+    return db.food.delete_food(current_session(), fid).to_response()
 
 @food_bp.route('/list', methods=['GET'])
+@session_required
+@etag_by_version('food', daily=True)
 def get_food_list():
-    sid = request.args.get('sid')
-    
-    return db.food.get_list_info(sid).to_response()
+    limit = request.args.get('limit', type=int)
+    list_cursor = request.args.get('cursor')
+    active_only = request.args.get('active', '1') not in ('0', 'false')
+    expiring_within = request.args.get('expiring_within', type=int)
+    food_type = request.args.get('type')
+    fields = request.args.get('fields')
+    fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+
+    return db.food.get_list_info(current_session(), limit, list_cursor, active_only, expiring_within, food_type, fields).to_response()
+
+@food_bp.route('/changes', methods=['GET'])
+@session_required
+def get_food_changes():
+    since = request.args.get('since', type=int)
+    limit = request.args.get('limit', type=int)
+
+    return db.food.get_changes(current_session(), since, limit).to_response()
+
+@food_bp.route('/search', methods=['GET'])
+@session_required
+def search_food():
+    query = request.args.get('q')
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+
+    return db.food.search_foods(current_session(), query, limit, offset).to_response()
+
+@food_bp.route('/summary', methods=['GET'])
+@session_required
+def get_food_summary():
+    return db.food.get_summary(current_session()).to_response()
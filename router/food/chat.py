@@ -1,24 +1,41 @@
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, stream_with_context
 import db.food_chat
+from src.auth import session_required, current_session
+from src.etag import etag_by_version
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/chat')
 
 @chat_bp.route('', methods=['GET'])
+@session_required
 def chat():
-    sid = request.args.get('sid')
     fcid = request.args.get('fcid')
 
-    return db.food_chat.get_info(sid, fcid).to_response()
+    return db.food_chat.get_info(current_session(), fcid).to_response()
 
 @chat_bp.route('', methods=['POST'])
+@session_required
 def create_food_chat():
-    sid = request.form.get('sid')
     fid_list = request.form.getlist('fid')
+    # 캐시된 레시피 대신 새로 생성하려면 no_cache=1
+    use_cache = request.form.get('no_cache', '0') not in ('1', 'true')
 
-    return db.food_chat.create_chat_db(sid, fid_list).to_response()
+    return db.food_chat.create_chat_db(current_session(), fid_list, use_cache).to_response()
 
 @chat_bp.route('/list', methods=['GET'])
+@session_required
+@etag_by_version('food_chat')
 def list_food_chats():
-    sid = request.args.get('sid')
+    return db.food_chat.get_list_info(current_session()).to_response()
 
-    return db.food_chat.get_list_info(sid).to_response()
\ No newline at end of file
+@chat_bp.route('/stream', methods=['GET'])
+@session_required
+def stream_food_chat():
+    fcid = request.args.get('fcid')
+
+    # 본인의 대화인지 먼저 확인한 뒤 SSE로 생성 결과 전달
+    chat_info = db.food_chat.get_info(current_session(), fcid)
+    if not chat_info.result:
+        return chat_info.to_response()
+
+    events = db.food_chat.stream_chat_events(current_session(), fcid)
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -1,6 +1,8 @@
 from flask import Blueprint, request
 import src.utils as utils
 import db.session
+from src.auth import session_required, current_session
+from src.etag import etag_by_version
 
 session_bp = Blueprint('session', __name__, url_prefix='/session')
 
@@ -20,16 +22,15 @@ def create_session():
     return db.session.create_session(login_email, login_password, login_useragent, login_ip).to_response()
 
 @session_bp.route('', methods=['DELETE'])
+@session_required
 def delete_session():
-    sid = request.form.get('sid')
-
-    return db.session.deactivate_session(sid).to_response()
+    return db.session.deactivate_session(current_session()).to_response()
 
 @session_bp.route('/list', methods=['GET'])
+@session_required
+@etag_by_version('session')
 def list_sessions():
-    sid = request.args.get('sid')
-
-    sessions = db.session.get_session_list(sid)
+    sessions = db.session.get_session_list(current_session())
     
     # If no sessions found or session ID is invalid
     if not sessions.result:
@@ -0,0 +1,20 @@
+from functools import wraps
+from flask import g, request
+import db.session
+
+# 요청마다 sid를 한 번만 검증하고 검증된 세션 정보를 g.user_session에 보관
+def session_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_session' not in g:
+            sid = request.values.get('sid')
+            session_info = db.session.get_context(sid)
+            if not session_info.result:
+                return session_info.to_response()
+            g.user_session = session_info.data['session']
+
+        return f(*args, **kwargs)
+    return decorated_function
+
+def current_session() -> db.session.SessionContext:
+    return g.user_session
@@ -0,0 +1,137 @@
+import os
+import time
+import db
+import src.utils as utils
+import src.email
+from datetime import timedelta
+from src.scheduler import PeriodicTask
+
+# 유통기한 임박 식품 알림 메일. 하루 한 번, 유저 uid 순서로 나누어 훑으며 유저별로 한 통씩 발송
+DIGEST_JOB_NAME = 'expiring-digest'
+DIGEST_CHECK_INTERVAL = 600
+DIGEST_SEND_HOUR = int(os.environ.get('DIGEST_SEND_HOUR', 9))       # 이 시각 이후에 그날의 발송 시작
+DIGEST_DAYS = int(os.environ.get('DIGEST_DAYS', 3))                 # 오늘부터 DIGEST_DAYS일 이내 만료 식품
+DIGEST_BATCH_SIZE = 200                                             # 한 번에 조회하는 유저 수
+DIGEST_MAX_ITEMS = 20                                               # 메일 한 통에 표시할 최대 식품 수
+DIGEST_MAX_PENDING = 100                                            # 메일 큐가 이보다 길면 잠시 대기
+DIGEST_BATCH_PAUSE = 1.0
+DIGEST_MAX_RUN_SECONDS = 300                                        # 한 번 실행에서 쓰는 최대 시간. 남은 유저는 다음 실행에서 이어서 처리
+
+def _load_checkpoint(run_key: str) -> dict:
+    # 새 날짜면 처음부터 시작. 여러 프로세스가 동시에 호출해도 진행 중인 위치를 되돌리지 않도록 이전 날짜일 때만 초기화
+    with db.connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO job_checkpoint (name, run_key) VALUES (?, ?)", (DIGEST_JOB_NAME, run_key))
+        conn.execute("""
+            UPDATE job_checkpoint SET run_key = ?, cursor = '', is_done = 0, processed = 0, updated_at = datetime('now', '+9 hours')
+            WHERE name = ? AND run_key < ?""", (run_key, DIGEST_JOB_NAME, run_key))
+        row = conn.execute("SELECT run_key, cursor, is_done, processed FROM job_checkpoint WHERE name = ?", (DIGEST_JOB_NAME,)).fetchone()
+    return {'run_key': row['run_key'], 'cursor': row['cursor'], 'is_done': bool(row['is_done']), 'processed': row['processed']}
+
+def _claim_batch(run_key: str, expected_cursor: str, next_cursor: str, is_done: bool, count: int) -> bool:
+    # 위치가 expected_cursor 그대로일 때만 다음 위치로 옮김. 다른 프로세스가 먼저 가져간 구간이면 False
+    # 발송 전에 위치를 옮기므로 발송 도중 중단되면 그 구간은 다시 보내지 않음(중복 발송 방지 우선)
+    with db.connection() as conn:
+        cursor = conn.execute("""
+            UPDATE job_checkpoint SET cursor = ?, is_done = ?, processed = processed + ?, updated_at = datetime('now', '+9 hours')
+            WHERE name = ? AND run_key = ? AND cursor = ? AND is_done = 0""",
+            (next_cursor, is_done, count, DIGEST_JOB_NAME, run_key, expected_cursor))
+        return cursor.rowcount == 1
+
+def _fetch_batch(after_uid: str, now: str, until: str, batch_size: int) -> tuple:
+    # 식품이 있는 유저를 uid 순서로 batch_size명 고른 뒤, 유저별 (uid, is_active, expiration_date) 인덱스 범위에서 임박 식품만 조회
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT uid FROM food_summary WHERE uid > ? AND total_items > 0 ORDER BY uid LIMIT ?", (after_uid, batch_size))
+    uids = [row['uid'] for row in cursor.fetchall()]
+    if not uids:
+        db.close_db_connection(conn)
+        return [], []
+
+    cursor.execute(f"""
+        SELECT uid, name, count, expiration_date, total FROM (
+            SELECT uid, name, count, expiration_date,
+                   ROW_NUMBER() OVER (PARTITION BY uid ORDER BY expiration_date) AS item_no,
+                   COUNT(*) OVER (PARTITION BY uid) AS total
+            FROM foods
+            WHERE uid IN ({', '.join('?' * len(uids))}) AND is_active = 1 AND expiration_date >= ? AND expiration_date < ?
+        ) WHERE item_no <= ? ORDER BY uid, expiration_date""", (*uids, now, until, DIGEST_MAX_ITEMS))
+    rows = cursor.fetchall()
+    db.close_db_connection(conn)
+    return uids, rows
+
+def _group_by_user(rows) -> dict:
+    digests = {}
+    for row in rows:
+        digest = digests.setdefault(row['uid'], {'items': [], 'total': row['total']})
+        digest['items'].append({'name': row['name'], 'count': row['count'], 'expiration_date': row['expiration_date']})
+    return digests
+
+def _fetch_recipients(uids: list) -> dict:
+    if not uids:
+        return {}
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT uid, email, name FROM users WHERE uid IN ({', '.join('?' * len(uids))})", uids)
+    recipients = {row['uid']: dict(row) for row in cursor.fetchall()}
+    db.close_db_connection(conn)
+    return recipients
+
+def _wait_for_email_queue(deadline: float) -> bool:
+    # 메일 큐가 비워질 때까지 대기. 실행 시간을 넘기면 False
+    while src.email.service.email_queue.qsize() > DIGEST_MAX_PENDING:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(DIGEST_BATCH_PAUSE)
+    return True
+
+def run_digest(force: bool = False) -> dict:
+    current = utils.get_current_datetime()
+    if not force and current.hour < DIGEST_SEND_HOUR:
+        return {'skipped': True}
+
+    run_key = current.strftime('%Y-%m-%d')
+    checkpoint = _load_checkpoint(run_key)
+    if checkpoint['is_done'] or checkpoint['run_key'] != run_key:
+        return {'skipped': True, 'processed': checkpoint['processed']}
+
+    now = utils.datetime_to_str(current)
+    until = utils.datetime_to_str(current + timedelta(days=DIGEST_DAYS))
+    deadline = time.monotonic() + DIGEST_MAX_RUN_SECONDS
+    after_uid = checkpoint['cursor']
+    processed = 0
+    sent = 0
+    is_done = False
+
+    while not is_done and time.monotonic() < deadline:
+        if not _wait_for_email_queue(deadline):
+            break
+
+        uids, rows = _fetch_batch(after_uid, now, until, DIGEST_BATCH_SIZE)
+        is_done = len(uids) < DIGEST_BATCH_SIZE
+        next_uid = uids[-1] if uids else after_uid
+        if not _claim_batch(run_key, after_uid, next_uid, is_done, len(uids)):
+            # 다른 프로세스가 이 구간을 먼저 가져감. 최신 위치에서 이어서 처리
+            checkpoint = _load_checkpoint(run_key)
+            if checkpoint['is_done'] or checkpoint['run_key'] != run_key:
+                break
+            after_uid = checkpoint['cursor']
+            is_done = False
+            continue
+
+        digests = _group_by_user(rows)
+        recipients = _fetch_recipients(list(digests))
+        for uid, digest in digests.items():
+            recipient = recipients.get(uid)
+            if recipient is None:
+                continue
+            src.email.service.send_expiring_digest_email(recipient['email'], recipient['name'], digest['items'], digest['total'], DIGEST_DAYS)
+            sent += 1
+
+        processed += len(uids)
+        after_uid = next_uid
+        if not is_done:
+            time.sleep(DIGEST_BATCH_PAUSE)
+
+    return {'skipped': False, 'sent': sent, 'processed': processed, 'is_done': is_done}
+
+digest_task = PeriodicTask('expiring-digest', DIGEST_CHECK_INTERVAL, run_digest, run_on_start=True)
@@ -3,6 +3,7 @@ import smtplib
 import os
 import threading
 import queue
+import contextlib
 import src.utils as utils
 from flask import render_template
 from email.mime.text import MIMEText
@@ -17,18 +18,37 @@ class EmailSender:
         self.smtp_port    = os.environ['MAIL_PORT']
         self.sender_email = os.environ['MAIL_USERNAME']
         self.password     = os.environ['MAIL_PASSWORD']
+        self.app = None
         self.email_queue = queue.Queue()
         self.worker_thread = threading.Thread(target=self._worker, daemon=True)
         self.worker_thread.start()
 
+    def init_app(self, app):
+        # 워커 스레드에서 템플릿을 렌더링할 때 사용할 Flask 앱
+        self.app = app
+
+    def _app_context(self):
+        return self.app.app_context() if self.app else contextlib.nullcontext()
+
     def _worker(self):
         while True:
             item = self.email_queue.get()
             if item is None:
                 break
-            receiver_email, subject, plain, html = item
-            self._send_email_now(receiver_email, subject, plain, html)
-            self.email_queue.task_done()
+            try:
+                # 지연 작업: 워커에서 조회/렌더링 후 전송
+                if callable(item[0]):
+                    build_email, args = item
+                    with self._app_context():
+                        item = build_email(*args)
+                    if item is None:
+                        continue
+                receiver_email, subject, plain, html = item
+                self._send_email_now(receiver_email, subject, plain, html)
+            except Exception as e:
+                print(f"Failed to build email: {e}")
+            finally:
+                self.email_queue.task_done()
 
     def _send_email_now(self, receiver_email: str, subject: str, plain, html):
         msg = MIMEMultipart("alternative")
@@ -54,6 +74,10 @@ class EmailSender:
     def send_email(self, receiver_email: str, subject: str, plain, html):
         self.email_queue.put((receiver_email, subject, plain, html))
 
+    def send_deferred(self, build_email, *args):
+        # build_email(*args)는 워커 스레드에서 (receiver_email, subject, plain, html)을 반환
+        self.email_queue.put((build_email, args))
+
     def send_verification_code_email(self, receiver_email: str, code: str):
         subject = f'[스마일푸드] 인증코드 {code}'
         plain = f'이메일 인증을 위한 코드는 {code}입니다.'
@@ -73,13 +97,28 @@ class EmailSender:
         self.send_email(receiver_email, subject, plain, html)
     
     def send_session_created_email(self, receiver_email: str, sid: str, session_deactive_link_hash: str):
-        session_info = db.session.get_info(sid).data['session_info']
+        self.send_deferred(self._build_session_created_email, receiver_email, sid, session_deactive_link_hash)
+
+    def _build_session_created_email(self, receiver_email: str, sid: str, session_deactive_link_hash: str):
+        session_info = db.session.get_info(sid)
+        if not session_info.result:
+            return None
+        session_info = session_info.data['session_info']
         user_info = db.user.get_info(session_info['uid']).data['user_info']
         subject = '[스마일푸드] 로그인 알림'
         plain = f'로그인 알림: {user_info["name"]}님, 새로운 환경에서 로그인 되었습니다.'
         session_deactive_link = f"{os.environ['SERVER_URL']}/session/deactive?link_hash={session_deactive_link_hash}"
         html = render_template('email/session_created_email.html', user_info=user_info, session_info=session_info, session_deactive_link=session_deactive_link)
-        self.send_email(receiver_email, subject, plain, html)
+        return receiver_email, subject, plain, html
+
+    def send_expiring_digest_email(self, receiver_email: str, name: str, items: list, total: int, days: int):
+        self.send_deferred(self._build_expiring_digest_email, receiver_email, name, items, total, days)
+
+    def _build_expiring_digest_email(self, receiver_email: str, name: str, items: list, total: int, days: int):
+        subject = f'[스마일푸드] 유통기한 임박 식품 {total}개'
+        plain = f'안녕하세요 {name}님, {days}일 이내에 유통기한이 끝나는 식품이 {total}개 있습니다.'
+        html = render_template('email/expiring_digest_email.html', name=name, items=items, total=total, days=days)
+        return receiver_email, subject, plain, html
 
     def send_password_find_email(self, receiver_email: str, user_info: utils.ResultDTO, link_hash: str):
         subject = '[스마일푸드] 비밀번호 찾기 요청'
@@ -0,0 +1,33 @@
+import hashlib
+from functools import wraps
+from flask import Response, make_response, request
+import db.version
+import src.utils as utils
+from src.auth import current_session
+
+# 유저별 데이터 버전으로 ETag를 만들고, If-None-Match가 일치하면 목록을 조회하지 않고 304 응답
+# session_required 뒤에 적용해야 함
+# daily: 응답에 오늘 날짜 기준 값(남은 일수, 임박 기준 등)이 들어가는 경우. 데이터가 그대로여도 날짜가 바뀌면 다른 ETag
+def etag_by_version(*resources, daily: bool = False):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            session = current_session()
+            versions = db.version.get_versions(session.uid, resources)
+            version_str = ','.join(f"{resource}:{versions[resource]}" for resource in resources)
+            if daily:
+                version_str += f",date:{utils.get_current_datetime().date().isoformat()}"
+            # 같은 목록이라도 조회 조건(query string)이 다르면 다른 ETag
+            etag = hashlib.sha256(f"{session.uid}|{version_str}|{request.path}|{request.query_string.decode()}".encode()).hexdigest()[:32]
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
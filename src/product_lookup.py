@@ -0,0 +1,142 @@
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait
+from dotenv import load_dotenv
+load_dotenv()
+
+# 외부 상품 정보 API(foodsafetykorea C005, retaildb) 조회 클라이언트
+# 두 출처를 동시에 조회하고, 제한 시간 안에 응답한 결과만 합쳐서 반환
+LOOKUP_DEADLINE = 3.0           # 바코드 1건 조회 제한 시간(초)
+LOOKUP_CONNECT_TIMEOUT = 1.5
+LOOKUP_MAX_WORKERS = 16
+HTTP_POOL_SIZE = 16
+
+BREAKER_FAILURE_THRESHOLD = 5   # 연속 실패 횟수가 이 값에 도달하면 해당 출처를 건너뜀
+BREAKER_RESET_TIMEOUT = 30      # 건너뛴 뒤 다시 시도하기까지 대기 시간(초)
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        # 열린 상태에서는 reset_timeout이 지난 뒤 한 번만 시험 요청을 허용(half-open)
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+def _create_http_session() -> requests.Session:
+    http_session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    http_session.mount('http://', adapter)
+    http_session.mount('https://', adapter)
+    return http_session
+
+class ProductSource:
+    def __init__(self, name: str, fetch):
+        self.name = name
+        self.fetch = fetch
+        self.http_session = _create_http_session()
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+
+    def lookup(self, barcode: str, timeout: float) -> dict | None:
+        try:
+            result = self.fetch(self.http_session, barcode, (LOOKUP_CONNECT_TIMEOUT, timeout))
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+def _fetch_foodsafety(http_session: requests.Session, barcode: str, timeout) -> dict | None:
+    foodsafety_api_url = f"http://openapi.foodsafetykorea.go.kr/api/{os.environ['FOODSAFETYKOREA_API_KEY']}/C005/json/1/100/BAR_CD={barcode}"
+    response = http_session.get(foodsafety_api_url, timeout=timeout)
+    response.raise_for_status()
+    rows = response.json().get('C005', {}).get('row') or []
+    if not rows:
+        return None
+    return {
+        'name': rows[0]['PRDLST_NM'],
+        'type': rows[0]['PRDLST_DCNM'],
+        'pog_daycnt': rows[0]['POG_DAYCNT']
+    }
+
+def _fetch_retaildb(http_session: requests.Session, barcode: str, timeout) -> dict | None:
+    retaildb_api_url = f"https://www.retaildb.or.kr/service/product_info/search/{barcode}"
+    response = http_session.get(retaildb_api_url, timeout=timeout, verify=False)
+    response.raise_for_status()
+    response_json = response.json()
+    if not response_json.get('baseItems'):
+        return None
+    return {
+        'name': response_json['baseItems'][0]['value'],
+        'volume': response_json.get('originVolume'),
+        'image_url': (response_json.get('images') or [None])[0]
+    }
+
+# 뒤에 있는 출처의 값이 앞의 값을 덮어씀(상품명은 retaildb 우선)
+SOURCES = [
+    ProductSource('foodsafetykorea', _fetch_foodsafety),
+    ProductSource('retaildb', _fetch_retaildb),
+]
+
+executor = ThreadPoolExecutor(max_workers=LOOKUP_MAX_WORKERS, thread_name_prefix='product-lookup')
+
+def lookup(barcode: str, deadline: float = LOOKUP_DEADLINE) -> tuple[dict, bool]:
+    # (출처별 결과를 합친 dict, 모든 출처가 제한 시간 안에 정상 응답했는지 여부) 반환
+    futures = {}
+    is_complete = True
+    for source in SOURCES:
+        if not source.breaker.allow():
+            is_complete = False
+            continue
+        futures[executor.submit(source.lookup, barcode, deadline)] = source
+
+    done, not_done = wait(futures, timeout=deadline)
+    if not_done:
+        is_complete = False
+        for future in not_done:
+            print(f"Product lookup timed out: {futures[future].name} ({barcode})")
+
+    results = {}
+    for future in done:
+        try:
+            results[futures[future].name] = future.result()
+        except Exception as e:
+            print(f"Product lookup failed: {futures[future].name} ({barcode}): {e}")
+            is_complete = False
+
+    product = {}
+    for source in SOURCES:
+        for key, value in (results.get(source.name) or {}).items():
+            if value is not None:
+                product[key] = value
+    return product, is_complete
+
+def get_status() -> dict:
+    return {source.name: {'failures': source.breaker.failures, 'is_open': source.breaker.is_open} for source in SOURCES}
@@ -0,0 +1,32 @@
+import threading
+
+# 일정 간격으로 func를 실행하는 백그라운드 작업
+class PeriodicTask:
+    def __init__(self, name: str, interval: float, func, run_on_start: bool = False):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.run_on_start = run_on_start
+        self._stop_event = threading.Event()
+        self._run_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self.thread.start()
+
+    def _worker(self):
+        if self.run_on_start:
+            self.run_now()
+        while not self._stop_event.wait(self.interval):
+            self.run_now()
+
+    def run_now(self):
+        # 주기 실행과 수동 실행이 겹치지 않도록 잠금
+        with self._run_lock:
+            try:
+                return self.func()
+            except Exception as e:
+                print(f"[{self.name}] Periodic task failed: {e}")
+
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
@@ -0,0 +1,31 @@
+import os
+import json
+import db.session
+import db.product
+import db.recipe
+import db.food_chat
+import src.product_lookup
+from src.scheduler import PeriodicTask
+
+# 대화 작업 큐, 메모리 캐시, 외부 상품 조회 상태를 주기적으로 한 줄 로그로 남김
+STATUS_LOG_INTERVAL = int(os.environ.get('STATUS_LOG_INTERVAL', 300))     # 0이면 기록하지 않음
+
+def collect() -> dict:
+    return {
+        'food_chat': db.food_chat.foodchat_service.stats(),
+        'recipe_flights': db.food_chat.recipe_flights.stats(),
+        'caches': {
+            'session': db.session.session_cache.stats(),
+            'product': db.product.product_memory_cache.stats(),
+            'recipe': db.recipe.recipe_memory_cache.stats(),
+        },
+        'product_lookup': src.product_lookup.get_status(),
+    }
+
+def log_status():
+    status = collect()
+    for key in ('avg_wait', 'max_wait'):
+        status['food_chat'][key] = round(status['food_chat'][key], 3)
+    print(f"[status] {json.dumps(status, ensure_ascii=False, separators=(',', ':'))}")
+
+status_logger = PeriodicTask('status-log', STATUS_LOG_INTERVAL, log_status) if STATUS_LOG_INTERVAL > 0 else None